@@ -1,7 +1,9 @@
 """Database configuration and session management."""
 
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from pathlib import Path
 from contextlib import contextmanager
 
@@ -17,13 +19,62 @@ ARTWORK_DIR.mkdir(exist_ok=True)
 
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Bounded connection pool so per-request sessions reuse open SQLite connections
+DB_POOL_SIZE = int(os.getenv("SIMPLETUNES_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("SIMPLETUNES_DB_MAX_OVERFLOW", "5"))
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 def init_db():
     """Initialize database tables."""
     Base.metadata.create_all(bind=engine)
+    _migrate_existing_tables()
+
+
+def _migrate_existing_tables():
+    """
+    Bring tables created by an older version up to the current models.
+
+    create_all never alters a table that already exists, so columns added
+    to a model later are added here with ALTER TABLE ... ADD COLUMN (existing
+    rows get NULL, which the services seed on first use), and indexes added
+    later are created if missing. Before a new unique index is created,
+    duplicate rows are dropped, keeping the oldest (the one lookups found).
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(
+                        text(
+                            f'ALTER TABLE "{table.name}" '
+                            f'ADD COLUMN "{column.name}" {column_type}'
+                        )
+                    )
+            for index in table.indexes:
+                if index.unique and index.name not in indexes:
+                    columns = ", ".join(f'"{column.name}"' for column in index.columns)
+                    conn.execute(
+                        text(
+                            f'DELETE FROM "{table.name}" WHERE rowid NOT IN '
+                            f'(SELECT MIN(rowid) FROM "{table.name}" GROUP BY {columns})'
+                        )
+                    )
+                index.create(conn, checkfirst=True)
 
 
 def get_db():
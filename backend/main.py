@@ -5,6 +5,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from database import init_db
+from services.scrobble import flush_history_writes
+from services.scrobble_http import close_session
 
 # Import all route modules
 from routes import (
@@ -32,9 +34,11 @@ from routes import (
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database on startup; finish pending writes on shutdown."""
     init_db()
     yield
+    await flush_history_writes()
+    await close_session()
 
 
 app = FastAPI(
@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from sqlalchemy import (
-    Column, String, Integer, Float, DateTime, ForeignKey, Table, Boolean, Text
+    Column, String, Integer, BigInteger, Float, DateTime, ForeignKey, Table, Boolean, Text
 )
 from sqlalchemy.orm import relationship, declarative_base
 import uuid
@@ -99,9 +99,11 @@ class Track(Base):
     channels = Column(Integer)
     file_format = Column(String)
     file_size = Column(Integer)
-    play_count = Column(Integer, default=0)
-    last_played = Column(DateTime)
-    date_added = Column(DateTime, default=datetime.utcnow)
+    file_mtime = Column(BigInteger)  # st_mtime_ns at last scan, to skip unchanged files
+    # Indexed for smart playlist rules and sorting
+    play_count = Column(Integer, default=0, index=True)
+    last_played = Column(DateTime, index=True)
+    date_added = Column(DateTime, default=datetime.utcnow, index=True)
     musicbrainz_id = Column(String)
 
     artist = relationship("Artist", back_populates="tracks")
@@ -1,7 +1,9 @@
 """Feature models: Queue, Scrobbling, Watch Folders, Duplicates."""
 
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Boolean, Text, JSON
+from sqlalchemy import (
+    Column, String, Integer, Float, DateTime, ForeignKey, Boolean, Text, LargeBinary, Index
+)
 from sqlalchemy.orm import relationship
 from .core import Base, generate_uuid
 
@@ -33,7 +35,9 @@ class QueueState(Base):
     current_index = Column(Integer, default=0)
     shuffle_enabled = Column(Boolean, default=False)
     repeat_mode = Column(String, default="off")  # off, one, all
-    shuffle_order = Column(JSON)  # Shuffled indices
+    shuffle_order = Column(LargeBinary)  # Shuffled indices, packed array('I')
+    total_tracks = Column(Integer, default=0)  # Cached count of queue items
+    revision = Column(Integer, default=0)  # Bumped whenever items or order change
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
@@ -56,6 +60,12 @@ class ScrobbleConfig(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # One row per service; a named index so init_db also adds it to
+        # existing databases, where a column-level UNIQUE never applies
+        Index("ix_scrobble_configs_service", "service", unique=True),
+    )
+
 
 class ScrobbleHistory(Base):
     """History of scrobbled tracks."""
@@ -65,11 +75,17 @@ class ScrobbleHistory(Base):
     track_id = Column(String, ForeignKey("tracks.id"), nullable=False)
     service = Column(String, nullable=False)
     status = Column(String, default="pending")  # pending, scrobbled, failed
-    scrobbled_at = Column(DateTime, default=datetime.utcnow)
+    scrobbled_at = Column(DateTime, default=datetime.utcnow, index=True)
     error_message = Column(Text)
 
     track = relationship("Track")
 
+    __table_args__ = (
+        # Failed-scrobble retry scan and per-service history, both by time
+        Index("ix_scrobble_history_status_time", "status", "scrobbled_at"),
+        Index("ix_scrobble_history_service_time", "service", "scrobbled_at"),
+    )
+
 
 # ============================================================================
 # Watch Folders
@@ -6,7 +6,7 @@ from typing import Optional
 from pydantic import BaseModel
 
 from database import get_db
-from services import SmartPlaylistService
+from services import InvalidRuleError, SmartPlaylistService
 
 router = APIRouter(prefix="/playlists/smart", tags=["Smart Playlists"])
 
@@ -66,10 +66,13 @@ def _track_to_response(track) -> dict:
 def create_smart_playlist(request: SmartPlaylistCreate, db: Session = Depends(get_db)):
     """Create a smart playlist with rules."""
     service = SmartPlaylistService(db)
-    playlist = service.create_smart_playlist(
-        request.name, request.rules, request.match_all,
-        request.limit, request.sort_by, request.sort_order, request.description
-    )
+    try:
+        playlist = service.create_smart_playlist(
+            request.name, request.rules, request.match_all,
+            request.limit, request.sort_by, request.sort_order, request.description
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return _playlist_to_response(playlist)
 
 
@@ -83,6 +86,8 @@ def update_smart_playlist(playlist_id: str, request: SmartPlaylistUpdate, db: Se
             request.limit, request.sort_by, request.sort_order, request.description
         )
         return _playlist_to_response(playlist)
+    except InvalidRuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -94,6 +99,8 @@ def refresh_smart_playlist(playlist_id: str, db: Session = Depends(get_db)):
     try:
         count = service.refresh_smart_playlist(playlist_id)
         return {"track_count": count}
+    except InvalidRuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -119,9 +126,12 @@ def get_smart_playlist_rules(playlist_id: str, db: Session = Depends(get_db)):
 def preview_smart_playlist(request: SmartPlaylistCreate, db: Session = Depends(get_db)):
     """Preview what tracks would match smart playlist rules."""
     service = SmartPlaylistService(db)
-    tracks = service.preview_smart_playlist(
-        request.rules, request.match_all, request.limit, request.sort_by, request.sort_order
-    )
+    try:
+        tracks = service.preview_smart_playlist(
+            request.rules, request.match_all, request.limit, request.sort_by, request.sort_order
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"tracks": [_track_to_response(t) for t in tracks], "count": len(tracks)}
 
 
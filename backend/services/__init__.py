@@ -26,7 +26,7 @@ from . import export_helpers
 # Split service modules (for advanced usage)
 from .lyrics_fetcher import LyricsService as LyricsFetcherService
 from .lyrics_parser import LyricsParser
-from .smart_playlist_builder import SmartPlaylistRule
+from .smart_playlist_builder import InvalidRuleError, SmartPlaylistRule
 from .smart_playlist_evaluator import SmartPlaylistService as SmartPlaylistEvaluatorService
 from .library_queries import LibraryQueryService
 from .library_stats import LibraryStatsService
@@ -67,6 +67,7 @@ __all__ = [
     "LyricsFetcherService",
     "LyricsParser",
     "SmartPlaylistRule",
+    "InvalidRuleError",
     "SmartPlaylistEvaluatorService",
     "LibraryQueryService",
     "LibraryStatsService",
@@ -52,16 +52,15 @@ class PlaylistFolderImporter:
             track_ids = (
                 self.db.query(collection_tracks.c.track_id)
                 .filter(collection_tracks.c.collection_id == collection_id)
-                .all()
+                .yield_per(1000)
             )
         else:
             # Get tracks by path matching
-            tracks = (
-                self.db.query(Track)
+            track_ids = (
+                self.db.query(Track.id)
                 .filter(Track.path.like(f"{path}%"))
-                .all()
+                .yield_per(1000)
             )
-            track_ids = [(t.id,) for t in tracks]
 
         return [t[0] for t in track_ids]
 
@@ -117,16 +116,20 @@ class PlaylistFolderImporter:
 
         return added_count
 
-    def update_collection_stats(self, collection: Collection, track_ids: list[str]) -> None:
+    def update_collection_stats(self, collection: Collection) -> None:
         """Update collection statistics."""
-        collection.track_count = len(track_ids)
-        collection.last_scanned = datetime.utcnow()
-        collection.total_duration = (
-            self.db.query(func.sum(Track.duration))
-            .filter(Track.id.in_(track_ids))
-            .scalar()
-            or 0
+        # Count and duration in one aggregate over the association table;
+        # avoids binding track_ids as an IN list
+        count, duration = (
+            self.db.query(func.count(), func.sum(Track.duration))
+            .select_from(collection_tracks)
+            .join(Track, Track.id == collection_tracks.c.track_id)
+            .filter(collection_tracks.c.collection_id == collection.id)
+            .one()
         )
+        collection.track_count = count or 0
+        collection.total_duration = duration or 0
+        collection.last_scanned = datetime.utcnow()
 
     @staticmethod
     def add_single_track(
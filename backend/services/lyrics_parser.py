@@ -3,6 +3,9 @@
 import re
 from typing import Optional
 
+# Match [mm:ss.xx] or [mm:ss] format
+_LRC_LINE_PATTERN = re.compile(r'\[(\d{2}):(\d{2})(?:\.(\d{2,3}))?\](.*)$')
+
 
 class LyricsParser:
     """Utilities for parsing and formatting lyrics data."""
@@ -44,11 +47,19 @@ class LyricsParser:
         Returns list of {time: float, text: str}
         """
         lines = []
-        # Match [mm:ss.xx] or [mm:ss] format
-        pattern = r'\[(\d{2}):(\d{2})(?:\.(\d{2,3}))?\](.*)$'
 
         for line in lrc_text.split('\n'):
-            match = re.match(pattern, line.strip())
+            line = line.strip()
+            # Cheap reject for blank lines and metadata tags ([ti:...], [ar:...])
+            # before handing the line to the regex engine
+            if (
+                len(line) < 7
+                or line[0] != '['
+                or not (line[1].isdigit() and line[2].isdigit() and line[3] == ':')
+            ):
+                continue
+
+            match = _LRC_LINE_PATTERN.match(line)
             if match:
                 minutes = int(match.group(1))
                 seconds = int(match.group(2))
@@ -57,7 +57,7 @@ class PlaylistService:
         scan_result, track_ids = self.folder_importer.scan_folder(str(path), collection.id)
 
         # Update collection stats
-        self.folder_importer.update_collection_stats(collection, track_ids)
+        self.folder_importer.update_collection_stats(collection)
 
         # Create playlist with these tracks
         playlist = Playlist(name=playlist_name)
@@ -20,16 +20,12 @@ class CollectionService:
 
     def get_collection_tracks(self, collection_id: str) -> list[Track]:
         """Get all tracks in a collection."""
-        track_ids = (
-            self.db.query(collection_tracks.c.track_id)
-            .filter(collection_tracks.c.collection_id == collection_id)
-            .all()
-        )
-        track_ids = [t[0] for t in track_ids]
-
+        # Join through the association table rather than materializing an
+        # IN list, which hits SQLite's parameter limit on large collections
         return (
             self.db.query(Track)
-            .filter(Track.id.in_(track_ids))
+            .join(collection_tracks, Track.id == collection_tracks.c.track_id)
+            .filter(collection_tracks.c.collection_id == collection_id)
             .options(joinedload(Track.artist), joinedload(Track.album))
             .all()
         )
@@ -2,11 +2,14 @@
 
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, case, delete, or_, select, update
+from sqlalchemy.orm import Session
 
 from models import QueueItem, QueueState, Track, Playlist, Album, playlist_tracks
-from .queue_shuffle import QueueShuffleMixin
+from .queue_shuffle import QueueShuffleMixin, queue_items_stmt
+
+# Rows/parameters per statement; stays well under SQLite's bound-parameter limit
+BATCH_SIZE = 500
 
 
 class QueueService(QueueShuffleMixin):
@@ -14,50 +17,89 @@ class QueueService(QueueShuffleMixin):
 
     def __init__(self, db: Session):
         self.db = db
+        self._state = None
+        self._shuffle_cache = None
+        self._track_dict_cache: dict[str, dict] = {}
         self._ensure_state_exists()
 
     def _ensure_state_exists(self):
         """Ensure queue state row exists."""
-        state = self.db.query(QueueState).filter(QueueState.id == 1).first()
-        if not state:
-            state = QueueState(id=1)
-            self.db.add(state)
+        state = self.db.get(QueueState, 1)
+        if not state or state.total_tracks is None or state.revision is None:
+            if not state:
+                state = QueueState(id=1)
+                self.db.add(state)
+            # Seed the cached item count and revision; rows from before
+            # these columns existed get NULL when init_db adds them
+            state.total_tracks = self.db.query(QueueItem).count()
+            state.revision = state.revision or 0
+            self.db.commit()
+        self._state = state
+
+        # Older rows stored the shuffle order as JSON text; rebuild it in
+        # the packed format instead of trying to decode it
+        if state.shuffle_order is not None and not isinstance(state.shuffle_order, bytes):
+            state.shuffle_order = None
+            if state.shuffle_enabled:
+                self._regenerate_shuffle()
             self.db.commit()
 
     def _get_state(self) -> QueueState:
-        """Get the queue state."""
-        return self.db.query(QueueState).filter(QueueState.id == 1).first()
+        """Get the queue state, loaded once per service instance."""
+        if self._state is None:
+            self._state = self.db.get(QueueState, 1)
+        return self._state
+
+    def _adjust_total_tracks(self, delta: int) -> int:
+        """
+        Add delta to the stored item count and return the new count.
+
+        The increment runs in SQL rather than writing back the count this
+        instance read, so concurrent sessions never lose each other's
+        updates; it also takes the write lock for the rest of the transaction.
+        """
+        self.db.execute(
+            update(QueueState)
+            .where(QueueState.id == 1)
+            .values(total_tracks=QueueState.total_tracks + delta)
+        )
+        state = self._get_state()
+        self.db.refresh(state, ["total_tracks"])
+        return state.total_tracks
 
     def get_queue(self) -> dict:
         """Get the current queue with all tracks and state."""
         state = self._get_state()
-        items = (
-            self.db.query(QueueItem)
-            .options(
-                joinedload(QueueItem.track).joinedload(Track.artist),
-                joinedload(QueueItem.track).joinedload(Track.album),
-            )
-            .order_by(QueueItem.position)
-            .all()
-        )
+        items = self.db.scalars(queue_items_stmt()).all()
 
-        # Get current track
-        current_track = None
-        if items and 0 <= state.current_index < len(items):
+        # Resolve the effective (shuffled) index of the current track up front
+        effective_index = -1
+        if 0 <= state.current_index < len(items):
             effective_index = state.current_index
-            if state.shuffle_enabled and state.shuffle_order:
-                effective_index = state.shuffle_order[state.current_index]
-            if 0 <= effective_index < len(items):
-                current_track = items[effective_index].track
+            shuffle_order = self._get_shuffle_order(state)
+            if shuffle_order:
+                effective_index = shuffle_order[state.current_index]
+
+        # Single pass: serialize items, sum duration and pick the current track
+        current_track = None
+        total_duration = 0
+        items_out = []
+        for item in items:
+            items_out.append(self._item_to_dict(item))
+            if item.track:
+                total_duration += item.track.duration
+                # Match on the stored position, not list order
+                if item.position == effective_index:
+                    current_track = item.track
 
         return {
-            "items": [self._item_to_dict(item) for item in items],
+            "items": items_out,
             "current_index": state.current_index,
             "current_track": self._track_to_dict(current_track) if current_track else None,
             "shuffle_enabled": state.shuffle_enabled,
             "repeat_mode": state.repeat_mode,
-            "total_tracks": len(items),
-            "total_duration": sum(item.track.duration for item in items if item.track),
+            "total_tracks": state.total_tracks,
+            "total_duration": total_duration,
         }
 
     def clear_queue(self) -> bool:
@@ -66,6 +108,8 @@ class QueueService(QueueShuffleMixin):
         state = self._get_state()
         state.current_index = 0
         state.shuffle_order = None
+        state.total_tracks = 0
+        self._bump_revision()
         self.db.commit()
         return True
 
@@ -77,14 +121,17 @@ class QueueService(QueueShuffleMixin):
         source_id: Optional[str] = None,
     ) -> QueueItem:
         """Add a single track to the queue."""
-        track = self.db.query(Track).filter(Track.id == track_id).first()
-        if not track:
+        if not self.db.query(Track.id).filter(Track.id == track_id).scalar():
             raise ValueError(f"Track not found: {track_id}")
 
-        # Get max position if not specified
+        state = self._get_state()
+
+        # Reserve the slot before inserting: the SQL increment holds the
+        # write lock, so the new count minus one is this session's append
+        # position even when another session is adding concurrently
+        total = self._adjust_total_tracks(1)
         if position is None:
-            max_pos = self.db.query(func.max(QueueItem.position)).scalar()
-            position = (max_pos or -1) + 1
+            position = total - 1
 
         item = QueueItem(
             track_id=track_id,
@@ -95,12 +142,13 @@ class QueueService(QueueShuffleMixin):
         self.db.add(item)
 
         # Regenerate shuffle if enabled
-        state = self._get_state()
         if state.shuffle_enabled:
             self._regenerate_shuffle()
+        self._bump_revision()
 
+        # id and added_at are Python-side defaults, so there is nothing
+        # server-generated to refresh; expired attributes load on access
         self.db.commit()
-        self.db.refresh(item)
         return item
 
     def add_tracks(
@@ -109,45 +157,74 @@ class QueueService(QueueShuffleMixin):
         source_type: Optional[str] = None,
         source_id: Optional[str] = None,
         clear_existing: bool = False,
+        validated: bool = False,
     ) -> int:
-        """Add multiple tracks to the queue."""
+        """
+        Add multiple tracks to the queue.
+
+        Args:
+            track_ids: Track IDs to append, in play order
+            source_type: Where the tracks came from (album, playlist, ...)
+            source_id: ID of the source
+            clear_existing: Clear the queue before adding
+            validated: Skip the existence check for ids read from the tracks table
+        """
         if clear_existing:
             self.clear_queue()
 
-        max_pos = self.db.query(func.max(QueueItem.position)).scalar()
-        start_pos = (max_pos or -1) + 1
-
-        added = 0
-        for i, track_id in enumerate(track_ids):
-            track = self.db.query(Track).filter(Track.id == track_id).first()
-            if track:
-                item = QueueItem(
-                    track_id=track_id,
-                    position=start_pos + i,
-                    source_type=source_type,
-                    source_id=source_id,
-                )
-                self.db.add(item)
-                added += 1
+        state = self._get_state()
 
-        if added > 0:
-            state = self._get_state()
-            if state.shuffle_enabled:
-                self._regenerate_shuffle()
+        if validated:
+            valid_ids = track_ids
+        else:
+            # Validate ids with batched IN queries instead of one SELECT per track
+            existing = set()
+            for i in range(0, len(track_ids), BATCH_SIZE):
+                existing.update(
+                    self.db.scalars(
+                        select(Track.id).where(
+                            Track.id.in_(track_ids[i:i + BATCH_SIZE])
+                        )
+                    )
+                )
+            valid_ids = [track_id for track_id in track_ids if track_id in existing]
+        if not valid_ids:
+            self.db.commit()
+            return 0
+
+        # Reserve the positions under the write lock, as in add_track
+        start_pos = self._adjust_total_tracks(len(valid_ids)) - len(valid_ids)
+
+        # Bulk insert bypasses the unit of work; id/added_at come from the
+        # column defaults. Batches share the single commit below.
+        mappings = [
+            {
+                "track_id": track_id,
+                "position": start_pos + i,
+                "source_type": source_type,
+                "source_id": source_id,
+            }
+            for i, track_id in enumerate(valid_ids)
+        ]
+        for i in range(0, len(mappings), BATCH_SIZE):
+            self.db.bulk_insert_mappings(QueueItem, mappings[i:i + BATCH_SIZE])
+        if state.shuffle_enabled:
+            self._regenerate_shuffle()
+        self._bump_revision()
 
         self.db.commit()
-        return added
+        return len(mappings)
 
     def add_album(self, album_id: str, clear_existing: bool = False) -> int:
         """Add all tracks from an album to the queue."""
-        tracks = (
-            self.db.query(Track)
-            .filter(Track.album_id == album_id)
+        track_ids = self.db.scalars(
+            select(Track.id)
+            .where(Track.album_id == album_id)
             .order_by(Track.disc_number, Track.track_number)
-            .all()
+        ).all()
+        return self.add_tracks(
+            track_ids, "album", album_id, clear_existing, validated=True
         )
-        track_ids = [t.id for t in tracks]
-        return self.add_tracks(track_ids, "album", album_id, clear_existing)
 
     def add_playlist(self, playlist_id: str, clear_existing: bool = False) -> int:
         """Add all tracks from a playlist to the queue."""
@@ -156,34 +233,43 @@ class QueueService(QueueShuffleMixin):
             raise ValueError(f"Playlist not found: {playlist_id}")
 
         # Get tracks in playlist order
-        track_ids = (
-            self.db.query(playlist_tracks.c.track_id)
-            .filter(playlist_tracks.c.playlist_id == playlist_id)
+        track_ids = self.db.scalars(
+            select(playlist_tracks.c.track_id)
+            .where(playlist_tracks.c.playlist_id == playlist_id)
             .order_by(playlist_tracks.c.position)
-            .all()
-        )
-        track_ids = [t[0] for t in track_ids]
+        ).all()
         return self.add_tracks(track_ids, "playlist", playlist_id, clear_existing)
 
     def add_artist(self, artist_id: str, clear_existing: bool = False) -> int:
         """Add all tracks from an artist to the queue."""
-        tracks = (
-            self.db.query(Track)
-            .filter(Track.artist_id == artist_id)
+        track_ids = self.db.scalars(
+            select(Track.id)
+            .where(Track.artist_id == artist_id)
             .order_by(Track.album_id, Track.disc_number, Track.track_number)
-            .all()
+        ).all()
+        return self.add_tracks(
+            track_ids, "artist", artist_id, clear_existing, validated=True
         )
-        track_ids = [t.id for t in tracks]
-        return self.add_tracks(track_ids, "artist", artist_id, clear_existing)
 
     def remove_track(self, queue_item_id: str) -> bool:
         """Remove a track from the queue by queue item ID."""
-        item = self.db.query(QueueItem).filter(QueueItem.id == queue_item_id).first()
-        if not item:
-            return False
+        stmt = delete(QueueItem).where(QueueItem.id == queue_item_id)
+        if self.db.get_bind().dialect.delete_returning:
+            # DELETE ... RETURNING gives us the position without loading the item
+            removed_position = self.db.execute(
+                stmt.returning(QueueItem.position)
+            ).scalar()
+        else:
+            removed_position = (
+                self.db.query(QueueItem.position)
+                .filter(QueueItem.id == queue_item_id)
+                .scalar()
+            )
+            if removed_position is not None:
+                self.db.execute(stmt)
 
-        removed_position = item.position
-        self.db.delete(item)
+        if removed_position is None:
+            return False
 
         # Adjust positions of items after removed one
         self.db.query(QueueItem).filter(QueueItem.position > removed_position).update(
@@ -192,45 +278,56 @@ class QueueService(QueueShuffleMixin):
 
         # Adjust current index if needed
         state = self._get_state()
+        self._adjust_total_tracks(-1)
         if removed_position < state.current_index:
             state.current_index -= 1
         elif removed_position == state.current_index:
             # Current track was removed, stay at same index (next track)
-            total = self.db.query(QueueItem).count()
+            total = state.total_tracks
             if state.current_index >= total:
                 state.current_index = max(0, total - 1)
 
         if state.shuffle_enabled:
             self._regenerate_shuffle()
+        self._bump_revision()
 
         self.db.commit()
         return True
 
     def move_track(self, queue_item_id: str, new_position: int) -> bool:
         """Move a track to a new position in the queue."""
-        item = self.db.query(QueueItem).filter(QueueItem.id == queue_item_id).first()
-        if not item:
+        old_position = (
+            self.db.query(QueueItem.position)
+            .filter(QueueItem.id == queue_item_id)
+            .scalar()
+        )
+        if old_position is None:
             return False
 
-        old_position = item.position
         if old_position == new_position:
             return True
 
-        # Adjust positions of affected items
+        # Shift the affected range and place the moved item in one UPDATE
+        is_moved = QueueItem.id == queue_item_id
         if new_position < old_position:
             # Moving up
-            self.db.query(QueueItem).filter(
+            in_range = and_(
                 QueueItem.position >= new_position,
                 QueueItem.position < old_position,
-            ).update({QueueItem.position: QueueItem.position + 1})
+            )
+            shifted = QueueItem.position + 1
         else:
             # Moving down
-            self.db.query(QueueItem).filter(
+            in_range = and_(
                 QueueItem.position > old_position,
                 QueueItem.position <= new_position,
-            ).update({QueueItem.position: QueueItem.position - 1})
+            )
+            shifted = QueueItem.position - 1
 
-        item.position = new_position
+        self.db.query(QueueItem).filter(or_(is_moved, in_range)).update(
+            {QueueItem.position: case((is_moved, new_position), else_=shifted)},
+            synchronize_session=False,
+        )
 
         # Update current index if it was affected
         state = self._get_state()
@@ -240,6 +337,7 @@ class QueueService(QueueShuffleMixin):
             state.current_index -= 1
         elif new_position <= state.current_index < old_position:
             state.current_index += 1
+        self._bump_revision()
 
         self.db.commit()
         return True
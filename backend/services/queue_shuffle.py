@@ -1,10 +1,53 @@
 """Shuffle and playback navigation for play queue."""
 
 import random
+import time
+from array import array
+from collections import OrderedDict
 from typing import Optional
-from sqlalchemy.orm import joinedload
-
-from models import QueueItem, Track
+from sqlalchemy import lambda_stmt, select, update
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from sqlalchemy.orm import defaultload, joinedload, raiseload, selectinload
+
+from models import QueueItem, QueueState, Track
+
+# Serialized upcoming/history windows, keyed by queue revision so any change
+# to items or order misses the cache; the TTL bounds staleness of track data
+WINDOW_CACHE_SIZE = 32
+WINDOW_CACHE_TTL = 30.0
+_window_cache: "OrderedDict[tuple, tuple[float, list[dict]]]" = OrderedDict()
+
+
+# Hot queue reads are built as lambda statements so SQLAlchemy caches their
+# compiled SQL after the first call instead of re-compiling per request
+def queue_items_stmt() -> StatementLambdaElement:
+    """All queue items in order, with track, artist and album loaded."""
+    return lambda_stmt(
+        lambda: select(QueueItem)
+        .options(
+            selectinload(QueueItem.track).selectinload(Track.artist),
+            selectinload(QueueItem.track).selectinload(Track.album),
+            defaultload(QueueItem.track).raiseload("*"),
+            raiseload("*"),
+        )
+        .order_by(QueueItem.position)
+    )
+
+
+def queue_item_at_stmt(index: int) -> StatementLambdaElement:
+    """The queue item at a given index, with track, artist and album joined."""
+    stmt = lambda_stmt(
+        lambda: select(QueueItem)
+        .options(
+            joinedload(QueueItem.track).joinedload(Track.artist),
+            joinedload(QueueItem.track).joinedload(Track.album),
+            defaultload(QueueItem.track).raiseload("*"),
+            raiseload("*"),
+        )
+        .order_by(QueueItem.position)
+    )
+    stmt += lambda s: s.offset(index).limit(1)
+    return stmt
 
 
 class QueueShuffleMixin:
@@ -12,24 +55,56 @@ class QueueShuffleMixin:
 
     def _regenerate_shuffle(self):
         """Regenerate the shuffle order."""
-        total = self.db.query(QueueItem).count()
+        state = self._get_state()
+        total = state.total_tracks
         if total == 0:
             return
 
-        state = self._get_state()
-        indices = list(range(total))
+        # Inside-out Fisher-Yates: the permutation is built while the list is
+        # filled, so there is no separate range() pass. Swap targets use
+        # Lemire's multiply-shift on a 64-bit word rather than randrange;
+        # the bias for queue-sized ranges is below 2**-32.
+        indices = [0] * total
+        getrandbits = random.getrandbits
+        for i in range(1, total):
+            j = (getrandbits(64) * (i + 1)) >> 64
+            indices[i] = indices[j]
+            indices[j] = i
 
         # Keep current track at current position if playing
         current = state.current_index
         if 0 <= current < total:
-            indices.remove(current)
-            random.shuffle(indices)
-            indices.insert(0, current)
+            pos = indices.index(current)
+            indices[0], indices[pos] = current, indices[0]
             state.current_index = 0
-        else:
-            random.shuffle(indices)
 
-        state.shuffle_order = indices
+        state.shuffle_order = array("I", indices).tobytes()
+
+    def _get_shuffle_order(self, state) -> Optional[array]:
+        """Decode the packed shuffle order, or None when shuffle is off."""
+        blob = state.shuffle_order if state.shuffle_enabled else None
+        if not blob or not isinstance(blob, bytes):
+            return None
+
+        # Reuse the decoded array until the stored blob changes
+        if self._shuffle_cache is None or self._shuffle_cache[0] is not blob:
+            order = array("I")
+            order.frombytes(blob)
+            self._shuffle_cache = (blob, order)
+        return self._shuffle_cache[1]
+
+    def _get_index_map(self, state, total: int):
+        """Map queue index to item position: shuffle order, or identity."""
+        return self._get_shuffle_order(state) or range(total)
+
+    def _bump_revision(self):
+        """Mark the queue's items or order as changed."""
+        # Increment in SQL so concurrent sessions cannot reuse a revision,
+        # then expire the cached value so the next read sees the new one
+        self.db.execute(
+            update(QueueState).where(QueueState.id == 1).values(revision=QueueState.revision + 1)
+        )
+        self.db.expire(self._get_state(), ["revision"])
 
     def set_shuffle(self, enabled: bool) -> dict:
         """Enable or disable shuffle mode."""
@@ -40,6 +115,7 @@ class QueueShuffleMixin:
             self._regenerate_shuffle()
         else:
             state.shuffle_order = None
+        self._bump_revision()
 
         self.db.commit()
         return {"shuffle_enabled": enabled}
@@ -56,11 +132,10 @@ class QueueShuffleMixin:
 
     def play_index(self, index: int) -> Optional[dict]:
         """Set the current playing index and return the track."""
-        total = self.db.query(QueueItem).count()
-        if index < 0 or index >= total:
+        state = self._get_state()
+        if index < 0 or index >= state.total_tracks:
             return None
 
-        state = self._get_state()
         state.current_index = index
         self.db.commit()
 
@@ -69,32 +144,28 @@ class QueueShuffleMixin:
     def get_current_track(self) -> Optional[dict]:
         """Get the currently playing track."""
         state = self._get_state()
-        items = self.db.query(QueueItem).order_by(QueueItem.position).all()
+        total = state.total_tracks
 
-        if not items:
+        if not total:
             return None
 
         effective_index = state.current_index
-        if state.shuffle_enabled and state.shuffle_order:
-            if 0 <= state.current_index < len(state.shuffle_order):
-                effective_index = state.shuffle_order[state.current_index]
-
-        if 0 <= effective_index < len(items):
-            item = items[effective_index]
-            track = (
-                self.db.query(Track)
-                .options(joinedload(Track.artist), joinedload(Track.album))
-                .filter(Track.id == item.track_id)
-                .first()
-            )
-            return self._track_to_dict(track) if track else None
-
-        return None
+        shuffle_order = self._get_shuffle_order(state)
+        if shuffle_order:
+            if 0 <= state.current_index < len(shuffle_order):
+                effective_index = shuffle_order[state.current_index]
+
+        if not 0 <= effective_index < total:
+            return None
+
+        # Fetch only the item at the effective position, with its track
+        item = self.db.scalars(queue_item_at_stmt(effective_index)).first()
+        return self._track_to_dict(item.track) if item and item.track else None
 
     def next_track(self) -> Optional[dict]:
         """Move to and return the next track."""
         state = self._get_state()
-        total = self.db.query(QueueItem).count()
+        total = state.total_tracks
 
         if total == 0:
             return None
@@ -120,7 +191,7 @@ class QueueShuffleMixin:
     def previous_track(self) -> Optional[dict]:
         """Move to and return the previous track."""
         state = self._get_state()
-        total = self.db.query(QueueItem).count()
+        total = state.total_tracks
 
         if total == 0:
             return None
@@ -141,67 +212,87 @@ class QueueShuffleMixin:
     def get_upcoming(self, limit: int = 10) -> list[dict]:
         """Get upcoming tracks after current position."""
         state = self._get_state()
-        items = (
-            self.db.query(QueueItem)
-            .options(
-                joinedload(QueueItem.track).joinedload(Track.artist),
-                joinedload(QueueItem.track).joinedload(Track.album),
-            )
-            .order_by(QueueItem.position)
-            .all()
-        )
-
-        if not items:
-            return []
-
-        upcoming = []
-        for i in range(state.current_index + 1, min(state.current_index + 1 + limit, len(items))):
-            effective_index = i
-            if state.shuffle_enabled and state.shuffle_order:
-                effective_index = state.shuffle_order[i]
-            if 0 <= effective_index < len(items):
-                upcoming.append(self._item_to_dict(items[effective_index]))
-
-        return upcoming
+        start = state.current_index + 1
+        return self._get_cached_window(state, start, start + limit)
 
     def get_history(self, limit: int = 10) -> list[dict]:
         """Get previously played tracks."""
         state = self._get_state()
-        items = (
-            self.db.query(QueueItem)
-            .options(
-                joinedload(QueueItem.track).joinedload(Track.artist),
-                joinedload(QueueItem.track).joinedload(Track.album),
-            )
-            .order_by(QueueItem.position)
-            .all()
-        )
-
-        if not items:
-            return []
-
-        history = []
         start = max(0, state.current_index - limit)
-        for i in range(start, state.current_index):
-            effective_index = i
-            if state.shuffle_enabled and state.shuffle_order:
-                effective_index = state.shuffle_order[i]
-            if 0 <= effective_index < len(items):
-                history.append(self._item_to_dict(items[effective_index]))
+        return self._get_cached_window(state, start, state.current_index)
+
+    def _get_cached_window(self, state, start: int, stop: int) -> list[dict]:
+        """Serve a queue window from the process cache, filling it on a miss."""
+        # Navigation only moves current_index, which is reflected in start/stop
+        key = (state.revision, state.shuffle_enabled, start, stop)
+        now = time.monotonic()
+
+        entry = _window_cache.get(key)
+        if entry is not None and entry[0] > now:
+            _window_cache.move_to_end(key)
+            return entry[1]
+
+        result = self._get_items_window(state, start, stop)
+        _window_cache[key] = (now + WINDOW_CACHE_TTL, result)
+        _window_cache.move_to_end(key)
+        if len(_window_cache) > WINDOW_CACHE_SIZE:
+            _window_cache.popitem(last=False)
+        return result
+
+    def _get_items_window(self, state, start: int, stop: int) -> list[dict]:
+        """Serialize the items at queue indices [start, stop), in play order."""
+        positions = self._get_index_map(state, state.total_tracks)[start:stop]
+        if not positions:
+            return []
 
-        return history
+        # Bind the serializer once rather than per item
+        item_to_dict = self._item_to_dict
+
+        stmt = queue_items_stmt()
+        if isinstance(positions, range):
+            # Unshuffled: the window is a contiguous run of positions
+            offset, count = positions.start, len(positions)
+            stmt += lambda s: s.offset(offset).limit(count)
+            return [item_to_dict(item) for item in self.db.scalars(stmt)]
+
+        # Shuffled: fetch only the window's positions, then restore play order
+        wanted = positions.tolist()
+        stmt += lambda s: s.where(QueueItem.position.in_(wanted))
+        by_position = {item.position: item for item in self.db.scalars(stmt)}
+        return [
+            item_to_dict(item)
+            for item in map(by_position.get, wanted)
+            if item is not None
+        ]
 
     def play_next(self, track_id: str):
         """Add a track to play next (after current track)."""
+        if not self.db.query(Track.id).filter(Track.id == track_id).scalar():
+            raise ValueError(f"Track not found: {track_id}")
+
         state = self._get_state()
         next_position = state.current_index + 1
 
-        # Shift items at and after next_position
+        # Shift items at and after next_position; the insert rides in the
+        # same transaction, so no separate max(position) lookup is needed
         self.db.query(QueueItem).filter(QueueItem.position >= next_position).update(
             {QueueItem.position: QueueItem.position + 1}
         )
 
-        return self.add_track(track_id, next_position, "manual")
+        item = QueueItem(
+            track_id=track_id,
+            position=next_position,
+            source_type="manual",
+        )
+        self.db.add(item)
+        self._adjust_total_tracks(1)
+
+        if state.shuffle_enabled:
+            self._regenerate_shuffle()
+        self._bump_revision()
+
+        self.db.commit()
+        return item
 
     def add_to_queue(self, track_id: str):
         """Add a track to the end of the queue."""
@@ -219,10 +310,15 @@ class QueueShuffleMixin:
         }
 
     def _track_to_dict(self, track) -> dict:
-        """Convert track to dictionary."""
+        """Convert track to dictionary, memoized per track for this instance."""
         if not track:
             return None
-        return {
+
+        cached = self._track_dict_cache.get(track.id)
+        if cached is not None:
+            return cached
+
+        track_dict = {
             "id": track.id,
             "path": track.path,
             "title": track.title,
@@ -234,3 +330,5 @@ class QueueShuffleMixin:
             "duration": track.duration,
             "track_number": track.track_number,
         }
+        self._track_dict_cache[track.id] = track_dict
+        return track_dict
@@ -4,10 +4,9 @@ from typing import Optional
 from sqlalchemy.orm import Session
 
 from .scanner_files import MusicScanner as FilesScanner
+from .scanner_files import SUPPORTED_EXTENSIONS  # Re-export for backward compatibility
 
-
-# Re-export for backward compatibility
-SUPPORTED_EXTENSIONS = {".mp3", ".m4a", ".flac", ".wav", ".aac", ".ogg", ".wma", ".aiff"}
+__all__ = ["MusicScanner", "SUPPORTED_EXTENSIONS"]
 
 
 class MusicScanner:
@@ -1,14 +1,55 @@
 """Music file scanner service."""
 
+import os
+import re
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
-from models import Track, Album, Artist, collection_tracks
+from models import Track, Album, Artist, collection_tracks, generate_uuid
 from .scanner_metadata import MetadataExtractor
 
 
-SUPPORTED_EXTENSIONS = {".mp3", ".m4a", ".flac", ".wav", ".aac", ".ogg", ".wma", ".aiff"}
+# New tracks written per INSERT batch during a scan
+BATCH_SIZE = 500
+
+SUPPORTED_EXTENSIONS = frozenset(
+    {".mp3", ".m4a", ".flac", ".wav", ".aac", ".ogg", ".wma", ".aiff"}
+)
+
+# Leading article moved to the end of an artist's sort name
+_SORT_PREFIX_RE = re.compile(r"(The|An?) (.*)", re.DOTALL)
+
+
+def iter_music_files(root: str) -> Iterator[tuple[os.DirEntry, str]]:
+    """
+    Walk a directory tree and yield (entry, suffix) for supported music files.
+
+    Uses os.scandir and filters on the raw entry name, so no Path objects
+    are built for covers, logs and other non-audio files. Hidden files and
+    directories are skipped; directory symlinks are not followed.
+    """
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if name[0] == ".":
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                dot = name.rfind(".")
+                if dot > 0:
+                    suffix = name[dot:].lower()
+                    if suffix in SUPPORTED_EXTENSIONS:
+                        yield entry, suffix
 
 
 class MusicScanner:
@@ -16,8 +57,14 @@ class MusicScanner:
 
     def __init__(self, db: Session):
         self.db = db
-        self._artist_cache: dict[str, Artist] = {}
-        self._album_cache: dict[str, Album] = {}
+        # Artist/album ids keyed by casefolded name/title
+        self._artist_cache: dict[str, str] = {}
+        self._album_cache: dict[str, str] = {}
+        # Existing tracks by path; only populated while scan_directory runs
+        self._track_cache: Optional[dict[str, Track]] = None
+        # New track rows and collection links waiting for a batched insert
+        self._pending_tracks: list[dict] = []
+        self._pending_links: list[dict] = []
 
     def scan_directory(
         self, directory: str, collection_id: Optional[str] = None
@@ -39,58 +86,106 @@ class MusicScanner:
         self._artist_cache.clear()
         self._album_cache.clear()
 
-        # Pre-populate cache with existing artists/albums
-        for artist in self.db.query(Artist).all():
-            self._artist_cache[artist.name.lower()] = artist
-        for album in self.db.query(Album).all():
-            key = f"{album.title.lower()}|{album.artist_id or ''}"
-            self._album_cache[key] = album
+        # Pre-populate cache with existing artist/album ids; only the key
+        # columns are read, streamed rather than loaded as ORM objects
+        artist_rows = self.db.query(Artist.id, Artist.name).yield_per(1000)
+        for artist_id, name in artist_rows:
+            self._artist_cache[name.casefold()] = artist_id
+        for album_id, title, artist_id in self.db.query(
+            Album.id, Album.title, Album.artist_id
+        ).yield_per(1000):
+            self._album_cache[f"{title.casefold()}|{artist_id or ''}"] = album_id
 
-        # Scan all files
-        for filepath in path.rglob("*"):
-            if filepath.suffix.lower() not in SUPPORTED_EXTENSIONS:
-                continue
-            if filepath.name.startswith("."):
+        # Load existing tracks under this directory once, instead of one
+        # existence query per file
+        self._track_cache = {
+            track.path: track
+            for track in self.db.query(Track)
+            .filter(Track.path.like(f"{path}%"))
+            .yield_per(1000)
+        }
+
+        # Stat each file once through its DirEntry and hand the result, with
+        # the suffix the walker already lower-cased, to the extractor
+        filepaths = []
+        suffixes = []
+        stats = []
+        for entry, suffix in iter_music_files(str(path)):
+            try:
+                stat = entry.stat()
+            except OSError:
                 continue
+            if not self._is_unchanged(entry.path, stat):
+                filepaths.append(entry.path)
+                suffixes.append(suffix)
+                stats.append(stat)
 
+        # Parse tags in parallel worker processes while this thread keeps
+        # sole ownership of the session
+        extracted = MetadataExtractor.extract_many(filepaths, suffixes, stats)
+        for filepath, metadata in zip(filepaths, extracted):
             try:
-                result = self._process_file(str(filepath), collection_id)
+                result = self._save_track(filepath, metadata, collection_id)
                 if result == "added":
                     added += 1
                 elif result == "updated":
                     updated += 1
             except Exception as e:
-                errors.append(f"{filepath.name}: {str(e)}")
+                errors.append(f"{os.path.basename(filepath)}: {str(e)}")
 
+        self._flush_pending_tracks()
+        self._track_cache = None
         self.db.commit()
 
         total = self.db.query(Track).count()
         return {"added": added, "updated": updated, "total": total, "errors": errors}
 
+    def _is_unchanged(self, filepath: str, stat: os.stat_result) -> bool:
+        """Check whether a known file's mtime and size match the last scan."""
+        existing = self._track_cache.get(filepath)
+        if existing is None or existing.file_mtime is None:
+            return False
+        return (
+            existing.file_mtime == stat.st_mtime_ns
+            and existing.file_size == stat.st_size
+        )
+
     def _process_file(
         self, filepath: str, collection_id: Optional[str] = None
     ) -> Optional[str]:
         """Process a single music file. Returns 'added', 'updated', or None."""
-        # Check if track already exists
-        existing = self.db.query(Track).filter(Track.path == filepath).first()
-
         metadata = MetadataExtractor.extract_metadata(filepath)
+        return self._save_track(filepath, metadata, collection_id)
+
+    def _save_track(
+        self,
+        filepath: str,
+        metadata: Optional[dict],
+        collection_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """Create or update the track for a file from extracted metadata."""
         if not metadata:
             return None
 
+        # Check if track already exists
+        if self._track_cache is not None:
+            existing = self._track_cache.get(filepath)
+        else:
+            existing = self.db.query(Track).filter(Track.path == filepath).first()
+
         # Get or create artist
-        artist = None
+        artist_id = None
         artist_name = metadata.get("artist")
         if artist_name:
-            artist = self._get_or_create_artist(artist_name)
+            artist_id = self._get_or_create_artist(artist_name)
 
         # Get or create album
-        album = None
+        album_id = None
         album_title = metadata.get("album")
         if album_title:
-            album = self._get_or_create_album(
+            album_id = self._get_or_create_album(
                 album_title,
-                artist.id if artist else None,
+                artist_id,
                 metadata.get("year"),
                 metadata.get("genre"),
             )
@@ -98,8 +193,8 @@ class MusicScanner:
         if existing:
             # Update existing track
             existing.title = metadata["title"]
-            existing.artist_id = artist.id if artist else None
-            existing.album_id = album.id if album else None
+            existing.artist_id = artist_id
+            existing.album_id = album_id
             existing.duration = metadata.get("duration", 0)
             existing.track_number = metadata.get("track_number")
             existing.disc_number = metadata.get("disc_number", 1)
@@ -110,41 +205,55 @@ class MusicScanner:
             existing.channels = metadata.get("channels")
             existing.file_format = metadata.get("file_format")
             existing.file_size = metadata.get("file_size")
+            existing.file_mtime = metadata.get("file_mtime")
             return "updated"
         else:
-            # Create new track
-            track = Track(
-                path=filepath,
-                title=metadata["title"],
-                artist_id=artist.id if artist else None,
-                album_id=album.id if album else None,
-                duration=metadata.get("duration", 0),
-                track_number=metadata.get("track_number"),
-                disc_number=metadata.get("disc_number", 1),
-                genre=metadata.get("genre"),
-                year=metadata.get("year"),
-                bitrate=metadata.get("bitrate"),
-                sample_rate=metadata.get("sample_rate"),
-                channels=metadata.get("channels"),
-                file_format=metadata.get("file_format"),
-                file_size=metadata.get("file_size"),
-            )
-            self.db.add(track)
-            self.db.flush()  # Get the track ID
+            # Queue new track for a batched insert; the id is generated here so
+            # the collection link can reference it before the row is written
+            track_id = generate_uuid()
+            self._pending_tracks.append({
+                "id": track_id,
+                "path": filepath,
+                "title": metadata["title"],
+                "artist_id": artist_id,
+                "album_id": album_id,
+                "duration": metadata.get("duration", 0),
+                "track_number": metadata.get("track_number"),
+                "disc_number": metadata.get("disc_number", 1),
+                "genre": metadata.get("genre"),
+                "year": metadata.get("year"),
+                "bitrate": metadata.get("bitrate"),
+                "sample_rate": metadata.get("sample_rate"),
+                "channels": metadata.get("channels"),
+                "file_format": metadata.get("file_format"),
+                "file_size": metadata.get("file_size"),
+                "file_mtime": metadata.get("file_mtime"),
+            })
 
             # Link to collection if provided
             if collection_id:
-                self.db.execute(
-                    collection_tracks.insert().values(
-                        collection_id=collection_id, track_id=track.id
-                    )
+                self._pending_links.append(
+                    {"collection_id": collection_id, "track_id": track_id}
                 )
 
+            # Outside a directory scan (e.g. the folder watcher) write at once
+            if self._track_cache is None or len(self._pending_tracks) >= BATCH_SIZE:
+                self._flush_pending_tracks()
+
             return "added"
 
-    def _get_or_create_artist(self, name: str) -> Artist:
-        """Get existing artist or create new one."""
-        key = name.lower()
+    def _flush_pending_tracks(self) -> None:
+        """Write queued new tracks and collection links as executemany INSERTs."""
+        if self._pending_tracks:
+            self.db.execute(insert(Track), self._pending_tracks)
+            self._pending_tracks = []
+        if self._pending_links:
+            self.db.execute(collection_tracks.insert(), self._pending_links)
+            self._pending_links = []
+
+    def _get_or_create_artist(self, name: str) -> str:
+        """Get existing artist or create new one. Returns the artist id."""
+        key = name.casefold()
         if key in self._artist_cache:
             return self._artist_cache[key]
 
@@ -154,8 +263,8 @@ class MusicScanner:
         )
         self.db.add(artist)
         self.db.flush()
-        self._artist_cache[key] = artist
-        return artist
+        self._artist_cache[key] = artist.id
+        return artist.id
 
     def _get_or_create_album(
         self,
@@ -163,9 +272,9 @@ class MusicScanner:
         artist_id: Optional[str],
         year: Optional[int],
         genre: Optional[str],
-    ) -> Album:
-        """Get existing album or create new one."""
-        key = f"{title.lower()}|{artist_id or ''}"
+    ) -> str:
+        """Get existing album or create new one. Returns the album id."""
+        key = f"{title.casefold()}|{artist_id or ''}"
         if key in self._album_cache:
             return self._album_cache[key]
 
@@ -177,13 +286,12 @@ class MusicScanner:
         )
         self.db.add(album)
         self.db.flush()
-        self._album_cache[key] = album
-        return album
+        self._album_cache[key] = album.id
+        return album.id
 
     def _make_sort_name(self, name: str) -> str:
         """Create a sortable name (e.g., 'The Beatles' -> 'Beatles, The')."""
-        prefixes = ["The ", "A ", "An "]
-        for prefix in prefixes:
-            if name.startswith(prefix):
-                return f"{name[len(prefix):]}, {prefix.strip()}"
+        match = _SORT_PREFIX_RE.match(name)
+        if match:
+            return f"{match.group(2)}, {match.group(1)}"
         return name
@@ -1,28 +1,77 @@
 """Music file metadata extraction."""
 
-from pathlib import Path
-from typing import Optional
-from mutagen import File as MutagenFile
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Sequence
+from mutagen import File as MutagenFile, MutagenError
+from mutagen.id3 import ID3
 from mutagen.mp4 import MP4
 from mutagen.flac import FLAC
 
+logger = logging.getLogger("simpletunes.scanner")
+
+# Easy-style keys shared by EasyID3 and FLAC/Vorbis comments
+_EASY_TEXT_KEYS = ("title", "artist", "album", "genre")
+# "n/total" number keys
+_EASY_NUMBER_KEYS = (("tracknumber", "track_number"), ("discnumber", "disc_number"))
+
+# MP4 atoms mapped to our fields
+_MP4_TEXT_ATOMS = (
+    ("\xa9nam", "title"),
+    ("\xa9ART", "artist"),
+    ("\xa9alb", "album"),
+    ("\xa9gen", "genre"),
+)
+_MP4_NUMBER_ATOMS = (("trkn", "track_number"), ("disk", "disc_number"))
+
+# Text frames read straight from parsed ID3 tags; these are the frames
+# EasyID3 maps to title/artist/album
+_ID3_TEXT_FRAMES = (("TIT2", "title"), ("TPE1", "artist"), ("TALB", "album"))
+# "n/total" number frames
+_ID3_NUMBER_FRAMES = (("TRCK", "track_number"), ("TPOS", "disc_number"))
+
+# Below this many files a process pool costs more to start than it saves
+PROCESS_POOL_MIN_FILES = 64
+# Files handed to a worker process per task
+PROCESS_POOL_CHUNKSIZE = 32
+
 
 class MetadataExtractor:
     """Extracts metadata from music files."""
 
     @staticmethod
-    def extract_metadata(filepath: str) -> Optional[dict]:
-        """Extract metadata from a music file."""
+    def extract_metadata(
+        filepath: str,
+        suffix: Optional[str] = None,
+        stat: Optional[os.stat_result] = None,
+    ) -> Optional[dict]:
+        """
+        Extract metadata from a music file.
+
+        Args:
+            filepath: Path to the file
+            suffix: Lower-cased extension (".mp3") if the caller already has it
+            stat: The file's stat result if the caller already has it
+        """
         try:
             audio = MutagenFile(filepath)
             if audio is None:
                 return None
 
-            path = Path(filepath)
+            # Plain string parsing; no Path object per file
+            stem, ext = os.path.splitext(os.path.basename(filepath))
+            if suffix is None:
+                suffix = ext.lower()
+
+            if stat is None:
+                stat = os.stat(filepath)
+
             metadata = {
-                "title": path.stem,  # Default to filename
-                "file_format": path.suffix.lower().lstrip("."),
-                "file_size": path.stat().st_size,
+                "title": stem,  # Default to filename
+                "file_format": suffix[1:],
+                "file_size": stat.st_size,
+                "file_mtime": stat.st_mtime_ns,
             }
 
             # Get audio info
@@ -32,117 +81,133 @@ class MetadataExtractor:
                 metadata["sample_rate"] = getattr(audio.info, "sample_rate", None)
                 metadata["channels"] = getattr(audio.info, "channels", None)
 
-            # Extract tags based on file type
+            # Extract tags based on file type, from the file parsed above
             if isinstance(audio, MP4):
                 metadata.update(MetadataExtractor._extract_mp4_tags(audio))
             elif isinstance(audio, FLAC):
-                metadata.update(MetadataExtractor._extract_vorbis_tags(audio))
+                metadata.update(MetadataExtractor._extract_easy_tags(audio))
+            elif isinstance(audio.tags, ID3):
+                # MP3, WAV, AIFF...: read frames directly rather than
+                # reopening the file with easy=True for EasyID3
+                metadata.update(MetadataExtractor._extract_id3_tags(audio.tags))
             else:
-                # Try EasyID3 for MP3 and similar
+                # Ogg and others already expose easy-style keys
                 try:
-                    easy = MutagenFile(filepath, easy=True)
-                    if easy:
-                        metadata.update(MetadataExtractor._extract_easy_tags(easy))
-                except Exception:
+                    metadata.update(MetadataExtractor._extract_easy_tags(audio))
+                except (KeyError, TypeError):
                     pass
 
             return metadata
 
+        except (MutagenError, OSError, ValueError):
+            # Unreadable, truncated or unsupported file
+            return None
         except Exception:
+            # Anything else is a bug worth seeing, but must not abort a scan
+            logger.exception("Unexpected error reading metadata from %s", filepath)
             return None
 
+    @staticmethod
+    def extract_many(
+        filepaths: Sequence[str],
+        suffixes: Optional[Sequence[str]] = None,
+        stats: Optional[Sequence[os.stat_result]] = None,
+    ) -> Iterator[Optional[dict]]:
+        """
+        Extract metadata for many files, yielding results in input order.
+
+        Tag parsing is CPU-bound Python, so large batches are spread over a
+        process pool (one worker per core) rather than threads sharing the GIL.
+        """
+        if suffixes is None:
+            suffixes = [None] * len(filepaths)
+        if stats is None:
+            stats = [None] * len(filepaths)
+
+        if len(filepaths) < PROCESS_POOL_MIN_FILES:
+            yield from map(
+                MetadataExtractor.extract_metadata, filepaths, suffixes, stats
+            )
+            return
+
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+            yield from pool.map(
+                MetadataExtractor.extract_metadata,
+                filepaths,
+                suffixes,
+                stats,
+                chunksize=PROCESS_POOL_CHUNKSIZE,
+            )
+
     @staticmethod
     def _extract_easy_tags(audio) -> dict:
-        """Extract tags from EasyID3-compatible files."""
+        """Extract tags from easy-style keys (EasyID3, FLAC/Vorbis comments)."""
         tags = {}
-        if "title" in audio:
-            tags["title"] = audio["title"][0]
-        if "artist" in audio:
-            tags["artist"] = audio["artist"][0]
-        if "album" in audio:
-            tags["album"] = audio["album"][0]
-        if "genre" in audio:
-            tags["genre"] = audio["genre"][0]
+        for key in _EASY_TEXT_KEYS:
+            if key in audio:
+                tags[key] = audio[key][0]
         if "date" in audio:
             try:
                 tags["year"] = int(audio["date"][0][:4])
             except (ValueError, IndexError):
                 pass
-        if "tracknumber" in audio:
-            try:
-                tn = audio["tracknumber"][0]
-                tags["track_number"] = int(tn.split("/")[0])
-            except (ValueError, IndexError):
-                pass
-        if "discnumber" in audio:
+        for key, our_key in _EASY_NUMBER_KEYS:
+            if key in audio:
+                try:
+                    tags[our_key] = int(audio[key][0].split("/")[0])
+                except (ValueError, IndexError):
+                    pass
+        return tags
+
+    @staticmethod
+    def _extract_id3_tags(tags: ID3) -> dict:
+        """Extract tags from parsed ID3 frames."""
+        out = {}
+        for frame_id, our_key in _ID3_TEXT_FRAMES:
+            frame = tags.get(frame_id)
+            if frame is not None and frame.text:
+                out[our_key] = str(frame.text[0])
+        genre = tags.get("TCON")
+        if genre is not None and genre.genres:
+            out["genre"] = genre.genres[0]
+        date = tags.get("TDRC")
+        if date is not None and date.text:
             try:
-                dn = audio["discnumber"][0]
-                tags["disc_number"] = int(dn.split("/")[0])
-            except (ValueError, IndexError):
+                out["year"] = int(date.text[0].text[:4])
+            except ValueError:
                 pass
-        return tags
+        for frame_id, our_key in _ID3_NUMBER_FRAMES:
+            frame = tags.get(frame_id)
+            if frame is not None and frame.text:
+                try:
+                    out[our_key] = int(str(frame.text[0]).split("/")[0])
+                except ValueError:
+                    pass
+        return out
 
     @staticmethod
     def _extract_mp4_tags(audio: MP4) -> dict:
         """Extract tags from MP4/M4A files."""
         tags = {}
-        tag_map = {
-            "\xa9nam": "title",
-            "\xa9ART": "artist",
-            "\xa9alb": "album",
-            "\xa9gen": "genre",
-            "\xa9day": "year",
-        }
-        for mp4_key, our_key in tag_map.items():
-            if mp4_key in audio:
-                value = audio[mp4_key][0]
-                if our_key == "year":
-                    try:
-                        tags[our_key] = int(str(value)[:4])
-                    except ValueError:
-                        pass
-                else:
-                    tags[our_key] = str(value)
-
-        if "trkn" in audio:
-            try:
-                tags["track_number"] = audio["trkn"][0][0]
-            except (IndexError, TypeError):
-                pass
+        for mp4_key, our_key in _MP4_TEXT_ATOMS:
+            value = audio.get(mp4_key)
+            if value:
+                tags[our_key] = str(value[0])
 
-        if "disk" in audio:
+        year = audio.get("\xa9day")
+        if year:
             try:
-                tags["disc_number"] = audio["disk"][0][0]
-            except (IndexError, TypeError):
+                tags["year"] = int(str(year[0])[:4])
+            except ValueError:
                 pass
 
-        return tags
+        # trkn/disk hold (number, total) pairs
+        for mp4_key, our_key in _MP4_NUMBER_ATOMS:
+            value = audio.get(mp4_key)
+            if value:
+                try:
+                    tags[our_key] = value[0][0]
+                except (IndexError, TypeError):
+                    pass
 
-    @staticmethod
-    def _extract_vorbis_tags(audio: FLAC) -> dict:
-        """Extract tags from FLAC/Vorbis files."""
-        tags = {}
-        if "title" in audio:
-            tags["title"] = audio["title"][0]
-        if "artist" in audio:
-            tags["artist"] = audio["artist"][0]
-        if "album" in audio:
-            tags["album"] = audio["album"][0]
-        if "genre" in audio:
-            tags["genre"] = audio["genre"][0]
-        if "date" in audio:
-            try:
-                tags["year"] = int(audio["date"][0][:4])
-            except (ValueError, IndexError):
-                pass
-        if "tracknumber" in audio:
-            try:
-                tags["track_number"] = int(audio["tracknumber"][0])
-            except ValueError:
-                pass
-        if "discnumber" in audio:
-            try:
-                tags["disc_number"] = int(audio["discnumber"][0])
-            except ValueError:
-                pass
         return tags
@@ -1,22 +1,84 @@
 """Scrobbling service for Last.fm, Libre.fm, and ListenBrainz."""
 
+import asyncio
+import logging
 import time
 from datetime import datetime
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
 
+from database import get_db_session
 from models import ScrobbleConfig, ScrobbleHistory, Track
+from .scrobble_http import get_session
 from .scrobble_lastfm import LastfmScrobbler
 from .scrobble_listenbrainz import ListenBrainzScrobbler
 
+logger = logging.getLogger("simpletunes.scrobble")
+
+# Enabled configs are read on every play but rarely change; keep them
+# (detached from any session) for a short TTL, dropped on any config write
+CONFIG_CACHE_TTL = 30.0
+# Batched retry submissions in flight at once, across all services
+RETRY_WORKERS = 8
+# Track ids per IN query when loading tracks for retries
+RETRY_BATCH_SIZE = 500
+_config_cache: Optional[tuple[float, list[ScrobbleConfig]]] = None
+
+
+def _invalidate_config_cache():
+    """Drop cached configs after a config write."""
+    global _config_cache
+    _config_cache = None
+
+
+# History writes scheduled by scrobble(), held until they finish so they are
+# not garbage collected and can be awaited on shutdown
+_history_tasks: set[asyncio.Task] = set()
+
+
+def _write_history(rows: list[dict]):
+    """Insert scrobble history rows in their own session (runs in a thread)."""
+    with get_db_session() as db:
+        db.execute(insert(ScrobbleHistory), rows)
+
+
+def _on_history_written(task: asyncio.Task):
+    """Release a finished history write and log it if it failed."""
+    _history_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Failed to record scrobble history", exc_info=task.exception())
+
+
+async def flush_history_writes():
+    """Wait for scheduled scrobble history writes to finish."""
+    if _history_tasks:
+        await asyncio.gather(*_history_tasks, return_exceptions=True)
+
 
 class ScrobbleService:
     """Service for scrobbling tracks to various services."""
 
     def __init__(self, db: Session):
         self.db = db
-        self.lastfm = LastfmScrobbler()
-        self.listenbrainz = ListenBrainzScrobbler()
+        self.lastfm = LastfmScrobbler(get_session)
+        self.listenbrainz = ListenBrainzScrobbler(get_session)
+        self._scrobblers = {
+            "lastfm": self.lastfm.scrobble_lastfm,
+            "librefm": self.lastfm.scrobble_librefm,
+            "listenbrainz": self.listenbrainz.scrobble_listenbrainz,
+        }
+        # Batch variants take a list of (track, timestamp) pairs
+        self._batch_scrobblers = {
+            "lastfm": self.lastfm.scrobble_lastfm_batch,
+            "librefm": self.lastfm.scrobble_librefm_batch,
+            "listenbrainz": self.listenbrainz.scrobble_listenbrainz_batch,
+        }
+        self._now_playing = {
+            "lastfm": self.lastfm.now_playing_lastfm,
+            "librefm": self.lastfm.now_playing_librefm,
+            "listenbrainz": self.listenbrainz.now_playing_listenbrainz,
+        }
 
     def get_config(self, service: str) -> Optional[ScrobbleConfig]:
         """Get configuration for a scrobbling service."""
@@ -53,6 +115,7 @@ class ScrobbleService:
         config.updated_at = datetime.utcnow()
 
         self.db.commit()
+        _invalidate_config_cache()
         self.db.refresh(config)
         return config
 
@@ -63,6 +126,7 @@ class ScrobbleService:
             return False
         config.enabled = enabled
         self.db.commit()
+        _invalidate_config_cache()
         return True
 
     def delete_config(self, service: str) -> bool:
@@ -72,8 +136,23 @@ class ScrobbleService:
             return False
         self.db.delete(config)
         self.db.commit()
+        _invalidate_config_cache()
         return True
 
+    def _get_enabled_configs(self) -> list[ScrobbleConfig]:
+        """Get enabled configs, served from the process cache while fresh."""
+        global _config_cache
+        now = time.monotonic()
+        if _config_cache is not None and now - _config_cache[0] < CONFIG_CACHE_TTL:
+            return _config_cache[1]
+
+        configs = self.db.query(ScrobbleConfig).filter(ScrobbleConfig.enabled == True).all()
+        # Detach so the cached objects are not expired by this session's commits
+        for config in configs:
+            self.db.expunge(config)
+        _config_cache = (now, configs)
+        return configs
+
     def get_lastfm_auth_url(self, api_key: str, callback_url: Optional[str] = None) -> str:
         """Get Last.fm authentication URL for user to authorize."""
         return self.lastfm.get_lastfm_auth_url(api_key, callback_url)
@@ -90,81 +169,107 @@ class ScrobbleService:
         timestamp: Optional[int] = None,
     ) -> dict:
         """Scrobble a track to all enabled services."""
-        track = self.db.query(Track).filter(Track.id == track_id).first()
+        results, history = await self._scrobble(track_id, timestamp)
+
+        # Write history off the request path; the commit's fsync no longer
+        # delays the response
+        if history:
+            task = asyncio.create_task(asyncio.to_thread(_write_history, history))
+            _history_tasks.add(task)
+            task.add_done_callback(_on_history_written)
+        return results
+
+    async def _scrobble(
+        self, track_id: str, timestamp: Optional[int]
+    ) -> tuple[dict, list[dict]]:
+        """Scrobble a track; returns results and history rows to insert."""
+        track = self._get_track(track_id)
         if not track:
             raise ValueError(f"Track not found: {track_id}")
 
         if not timestamp:
             timestamp = int(time.time())
 
-        results = {}
-        configs = self.db.query(ScrobbleConfig).filter(ScrobbleConfig.enabled == True).all()
-
-        for config in configs:
-            try:
-                if config.service == "lastfm":
-                    success = await self.lastfm.scrobble_lastfm(track, config, timestamp)
-                elif config.service == "librefm":
-                    success = await self.lastfm.scrobble_librefm(track, config, timestamp)
-                elif config.service == "listenbrainz":
-                    success = await self.listenbrainz.scrobble_listenbrainz(track, config, timestamp)
-                else:
-                    continue
+        configs = [
+            config
+            for config in self._get_enabled_configs()
+            if config.service in self._scrobblers
+        ]
+
+        # Services are independent, so submit to all of them concurrently
+        outcomes = await asyncio.gather(
+            *(
+                self._scrobblers[config.service](track, config, timestamp)
+                for config in configs
+            ),
+            return_exceptions=True,
+        )
 
+        results = {}
+        history = []
+        for config, outcome in zip(configs, outcomes):
+            if isinstance(outcome, Exception):
+                history.append(
+                    self._history_row(track_id, config.service, "failed", str(outcome))
+                )
+                results[config.service] = {"success": False, "error": str(outcome)}
+            else:
                 # Record in history
-                status = "scrobbled" if success else "failed"
-                self._record_scrobble(track_id, config.service, status)
-                results[config.service] = {"success": success}
+                status = "scrobbled" if outcome else "failed"
+                history.append(self._history_row(track_id, config.service, status))
+                results[config.service] = {"success": outcome}
 
-            except Exception as e:
-                self._record_scrobble(track_id, config.service, "failed", str(e))
-                results[config.service] = {"success": False, "error": str(e)}
-
-        return results
+        return results, history
 
     async def update_now_playing(self, track_id: str) -> dict:
         """Update 'now playing' status on all enabled services."""
-        track = self.db.query(Track).filter(Track.id == track_id).first()
+        track = self._get_track(track_id)
         if not track:
             raise ValueError(f"Track not found: {track_id}")
 
-        results = {}
-        configs = self.db.query(ScrobbleConfig).filter(ScrobbleConfig.enabled == True).all()
-
-        for config in configs:
-            try:
-                if config.service == "lastfm":
-                    success = await self.lastfm.now_playing_lastfm(track, config)
-                elif config.service == "librefm":
-                    success = await self.lastfm.now_playing_librefm(track, config)
-                elif config.service == "listenbrainz":
-                    success = await self.listenbrainz.now_playing_listenbrainz(track, config)
-                else:
-                    continue
+        configs = [
+            config
+            for config in self._get_enabled_configs()
+            if config.service in self._now_playing
+        ]
 
-                results[config.service] = {"success": success}
+        outcomes = await asyncio.gather(
+            *(self._now_playing[config.service](track, config) for config in configs),
+            return_exceptions=True,
+        )
 
-            except Exception as e:
-                results[config.service] = {"success": False, "error": str(e)}
+        results = {}
+        for config, outcome in zip(configs, outcomes):
+            if isinstance(outcome, Exception):
+                results[config.service] = {"success": False, "error": str(outcome)}
+            else:
+                results[config.service] = {"success": outcome}
 
         return results
 
-    def _record_scrobble(
-        self,
+    def _get_track(self, track_id: str) -> Optional[Track]:
+        """Load a track with the artist and album every service payload reads."""
+        return (
+            self.db.query(Track)
+            .options(joinedload(Track.artist), joinedload(Track.album))
+            .filter(Track.id == track_id)
+            .first()
+        )
+
+    @staticmethod
+    def _history_row(
         track_id: str,
         service: str,
         status: str,
         error: Optional[str] = None,
-    ):
-        """Record a scrobble attempt in history."""
-        history = ScrobbleHistory(
-            track_id=track_id,
-            service=service,
-            status=status,
-            error_message=error,
-        )
-        self.db.add(history)
-        self.db.commit()
+    ) -> dict:
+        """Build a scrobble history row; id and scrobbled_at use column defaults."""
+        return {
+            "track_id": track_id,
+            "service": service,
+            "status": status,
+            "error_message": error,
+        }
 
     def get_scrobble_history(
         self,
@@ -190,49 +295,98 @@ class ScrobbleService:
         )
 
     async def retry_failed_scrobbles(self) -> dict:
-        """Retry all failed scrobbles."""
+        """
+        Retry all failed scrobbles, committing once at the end.
+
+        Each entry is resent only to the service it failed on, grouped into
+        batched submissions of up to MAX_BATCH scrobbles per request.
+        """
         failed = self.get_pending_scrobbles()
-        results = {"retried": 0, "success": 0, "failed": 0}
 
+        # Load every referenced track (with artist/album) in batched IN queries
+        track_ids = list({entry.track_id for entry in failed})
+        tracks = {}
+        for i in range(0, len(track_ids), RETRY_BATCH_SIZE):
+            for track in (
+                self.db.query(Track)
+                .options(joinedload(Track.artist), joinedload(Track.album))
+                .filter(Track.id.in_(track_ids[i:i + RETRY_BATCH_SIZE]))
+            ):
+                tracks[track.id] = track
+
+        # Group entries by service; services that are disabled stay failed
+        configs = {
+            config.service: config
+            for config in self._get_enabled_configs()
+            if config.service in self._batch_scrobblers
+        }
+        by_service: dict[str, list[ScrobbleHistory]] = {}
         for entry in failed:
-            results["retried"] += 1
-            try:
-                result = await self.scrobble(
-                    entry.track_id,
-                    int(entry.scrobbled_at.timestamp()),
-                )
-                if result.get(entry.service, {}).get("success"):
-                    results["success"] += 1
-                    # Update original entry
-                    entry.status = "scrobbled"
-                    entry.error_message = None
-                else:
-                    results["failed"] += 1
-            except Exception as e:
-                results["failed"] += 1
-                entry.error_message = str(e)
+            if entry.track_id not in tracks:
+                entry.error_message = f"Track not found: {entry.track_id}"
+            elif entry.service in configs:
+                by_service.setdefault(entry.service, []).append(entry)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for service, entries in by_service.items():
+            for i in range(0, len(entries), LastfmScrobbler.MAX_BATCH):
+                queue.put_nowait((service, entries[i:i + LastfmScrobbler.MAX_BATCH]))
+
+        async def worker() -> int:
+            # Session work between awaits is synchronous, so workers can
+            # share self.db on the event loop
+            succeeded = 0
+            while not queue.empty():
+                service, entries = queue.get_nowait()
+                items = [
+                    (tracks[entry.track_id], int(entry.scrobbled_at.timestamp()))
+                    for entry in entries
+                ]
+                try:
+                    outcomes = await self._batch_scrobblers[service](
+                        items, configs[service]
+                    )
+                except Exception as e:
+                    for entry in entries:
+                        entry.error_message = str(e)
+                    continue
+                for entry, outcome in zip(entries, outcomes):
+                    if outcome:
+                        succeeded += 1
+                        # Update original entry
+                        entry.status = "scrobbled"
+                        entry.error_message = None
+            return succeeded
+
+        counts = await asyncio.gather(
+            *(worker() for _ in range(min(RETRY_WORKERS, queue.qsize())))
+        )
 
         self.db.commit()
-        return results
+        success = sum(counts)
+        return {"retried": len(failed), "success": success, "failed": len(failed) - success}
 
     def get_stats(self) -> dict:
         """Get scrobbling statistics."""
         from sqlalchemy import func
 
-        total = self.db.query(ScrobbleHistory).count()
-        by_service = (
-            self.db.query(ScrobbleHistory.service, func.count(ScrobbleHistory.id))
-            .group_by(ScrobbleHistory.service)
-            .all()
-        )
-        by_status = (
-            self.db.query(ScrobbleHistory.status, func.count(ScrobbleHistory.id))
-            .group_by(ScrobbleHistory.status)
+        # One grouped scan; totals per service/status are pivoted here
+        rows = (
+            self.db.query(ScrobbleHistory.service, ScrobbleHistory.status, func.count())
+            .group_by(ScrobbleHistory.service, ScrobbleHistory.status)
             .all()
         )
 
+        total = 0
+        by_service: dict[str, int] = {}
+        by_status: dict[str, int] = {}
+        for service, status, count in rows:
+            total += count
+            by_service[service] = by_service.get(service, 0) + count
+            by_status[status] = by_status.get(status, 0) + count
+
         return {
             "total_scrobbles": total,
-            "by_service": {s: c for s, c in by_service},
-            "by_status": {s: c for s, c in by_status},
+            "by_service": by_service,
+            "by_status": by_status,
         }
@@ -0,0 +1,113 @@
+"""HTTP helpers shared by the scrobbling implementations."""
+
+import asyncio
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+import aiohttp
+
+# Attempts per request, including the first
+MAX_ATTEMPTS = 3
+# First backoff delay in seconds; doubles on each retry
+BACKOFF_BASE = 1.0
+# Longer Retry-After waits are left to retry_failed_scrobbles
+MAX_RETRY_DELAY = 30.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# One session per process, so keep-alive connections outlive each request
+_session: Optional[aiohttp.ClientSession] = None
+# Hosts whose rate limit (X-RateLimit-Remaining) ran out, mapped to the
+# monotonic time it resets; requests to them wait instead of drawing a 429
+_rate_limit_resets: dict[str, float] = {}
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Get the shared scrobbling HTTP session, created on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            # Scrobbles arrive minutes apart; keep idle sockets long enough
+            # to be reused, and reap ones the server closed. The connector
+            # pools per host, so last.fm and libre.fm never share sockets.
+            connector=aiohttp.TCPConnector(
+                limit=20,
+                limit_per_host=4,
+                keepalive_timeout=120,
+                force_close=False,
+                enable_cleanup_closed=True,
+                ttl_dns_cache=300,
+            ),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+    return _session
+
+
+async def close_session():
+    """Close the shared session (on application shutdown)."""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP-date form; fall back to exponential backoff
+        return None
+
+
+def _note_rate_limit(host: str, headers) -> Optional[float]:
+    """
+    Record MetaBrainz-style rate limit headers for a host.
+
+    Returns X-RateLimit-Reset-In (seconds) when the server sent it.
+    """
+    reset_in = _parse_retry_after(headers.get("X-RateLimit-Reset-In"))
+    if reset_in is not None and headers.get("X-RateLimit-Remaining") == "0":
+        _rate_limit_resets[host] = time.monotonic() + reset_in
+    return reset_in
+
+
+async def post_with_retry(
+    session: aiohttp.ClientSession, url: str, **kwargs
+) -> tuple[int, bytes]:
+    """
+    POST with retries on connection errors, 429 and 5xx responses.
+
+    Waits Retry-After (or X-RateLimit-Reset-In) when the server sends one,
+    otherwise backs off exponentially, and holds requests to a host whose
+    rate limit is used up until it resets. Returns the final (status, body).
+    """
+    host = urlsplit(url).netloc
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        retry_after = None
+
+        wait = _rate_limit_resets.get(host, 0.0) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(min(wait, MAX_RETRY_DELAY))
+
+        try:
+            async with session.post(url, **kwargs) as response:
+                body = await response.read()
+                reset_in = _note_rate_limit(host, response.headers)
+                if response.status not in RETRY_STATUSES or last_attempt:
+                    return response.status, body
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is None:
+                    retry_after = reset_in
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # The session's total timeout raises asyncio.TimeoutError, which
+            # is not a ClientError
+            if last_attempt:
+                raise
+
+        delay = BACKOFF_BASE * 2 ** attempt if retry_after is None else retry_after
+        if delay > MAX_RETRY_DELAY:
+            return response.status, body
+        await asyncio.sleep(delay)
@@ -2,9 +2,25 @@
 
 import hashlib
 import aiohttp
-from typing import Optional
+import orjson
+from typing import Awaitable, Callable, Optional
 
 from models import ScrobbleConfig, Track
+from .scrobble_http import post_with_retry
+
+# Every key a single-track call signs, in signature (sorted) order
+_SIGNED_PARAM_ORDER = (
+    "album",
+    "api_key",
+    "artist",
+    "duration",
+    "method",
+    "sk",
+    "timestamp",
+    "token",
+    "track",
+)
+_SIGNED_PARAM_KEYS = frozenset(_SIGNED_PARAM_ORDER)
 
 
 class LastfmScrobbler:
@@ -12,9 +28,14 @@ class LastfmScrobbler:
 
     LASTFM_API_URL = "https://ws.audioscrobbler.com/2.0/"
     LIBREFM_API_URL = "https://libre.fm/2.0/"
+    # Most scrobbles track.scrobble accepts in one call
+    MAX_BATCH = 50
 
-    def __init__(self):
-        pass
+    def __init__(self, get_session: Callable[[], Awaitable[aiohttp.ClientSession]]):
+        # Returns the process-wide HTTP session (see scrobble_http)
+        self._get_session = get_session
+        # Last track params built, keyed by (track id, timestamp)
+        self._track_params_cache: Optional[tuple[tuple, dict]] = None
 
     # =========================================================================
     # Last.fm Authentication
@@ -42,9 +63,9 @@ class LastfmScrobbler:
         params["api_sig"] = sig
         params["format"] = "json"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.LASTFM_API_URL, params=params) as response:
-                data = await response.json()
+        session = await self._get_session()
+        async with session.get(self.LASTFM_API_URL, params=params) as response:
+            data = await response.json(loads=orjson.loads)
 
         if "error" in data:
             raise ValueError(data.get("message", "Authentication failed"))
@@ -57,11 +78,37 @@ class LastfmScrobbler:
 
     def _generate_lastfm_signature(self, params: dict, secret: str) -> str:
         """Generate Last.fm API signature."""
-        # Sort params and concatenate
-        sorted_params = sorted(params.items())
-        sig_string = "".join(f"{k}{v}" for k, v in sorted_params)
-        sig_string += secret
-        return hashlib.md5(sig_string.encode()).hexdigest()
+        # Sorted key/value pairs followed by the secret, hashed in one call.
+        # The usual keys are walked in a presorted order; anything else
+        # (e.g. indexed batch keys) falls back to sorting.
+        if params.keys() <= _SIGNED_PARAM_KEYS:
+            parts = [f"{k}{params[k]}" for k in _SIGNED_PARAM_ORDER if k in params]
+        else:
+            parts = [f"{k}{v}" for k, v in sorted(params.items())]
+        parts.append(secret)
+        # MD5 is the API's signing scheme, not a security control here;
+        # saying so keeps FIPS-mode OpenSSL builds from refusing it
+        return hashlib.md5("".join(parts).encode(), usedforsecurity=False).hexdigest()
+
+    def _track_params(self, track: Track, timestamp: Optional[int] = None) -> dict:
+        """Track fields for a Last.fm/Libre.fm call, built once per track and time."""
+        key = (track.id, timestamp)
+        if self._track_params_cache is None or self._track_params_cache[0] != key:
+            params = {
+                "artist": track.artist.name if track.artist else "Unknown",
+                "track": track.title,
+            }
+            if timestamp is not None:
+                params["timestamp"] = str(timestamp)
+
+            if track.album:
+                params["album"] = track.album.title
+
+            if track.duration:
+                params["duration"] = str(int(track.duration))
+
+            self._track_params_cache = (key, params)
+        return self._track_params_cache[1]
 
     # =========================================================================
     # Last.fm Scrobbling
@@ -71,36 +118,72 @@ class LastfmScrobbler:
         self, track: Track, config: ScrobbleConfig, timestamp: int
     ) -> bool:
         """Scrobble to Last.fm."""
+        results = await self.scrobble_lastfm_batch([(track, timestamp)], config)
+        return results[0]
+
+    async def scrobble_lastfm_batch(
+        self, items: list[tuple[Track, int]], config: ScrobbleConfig
+    ) -> list[bool]:
+        """Scrobble up to MAX_BATCH (track, timestamp) pairs to Last.fm in one call."""
         if not config.session_key:
             raise ValueError("Last.fm not authenticated")
+        return await self._scrobble_batch(items, config, self.LASTFM_API_URL)
 
+    async def _scrobble_batch(
+        self, items: list[tuple[Track, int]], config: ScrobbleConfig, api_url: str
+    ) -> list[bool]:
+        """Send one signed track.scrobble call; returns acceptance per item."""
         params = {
             "method": "track.scrobble",
             "api_key": config.api_key,
             "sk": config.session_key,
-            "artist": track.artist.name if track.artist else "Unknown",
-            "track": track.title,
-            "timestamp": str(timestamp),
         }
-
-        if track.album:
-            params["album"] = track.album.title
-
-        if track.duration:
-            params["duration"] = str(int(track.duration))
-
-        sig = self._generate_lastfm_signature(params, config.api_secret)
-        params["api_sig"] = sig
-        params["format"] = "json"
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.LASTFM_API_URL, data=params) as response:
-                data = await response.json()
-
-        return "scrobbles" in data and data["scrobbles"].get("@attr", {}).get("accepted", 0) > 0
+        if len(items) == 1:
+            track, timestamp = items[0]
+            params.update(self._track_params(track, timestamp))
+        else:
+            # Batches use indexed keys: artist[0], track[0], artist[1], ...
+            for i, (track, timestamp) in enumerate(items):
+                for key, value in self._track_params(track, timestamp).items():
+                    params[f"{key}[{i}]"] = value
+
+        status, body = await self._signed_post(api_url, params, config.api_secret)
+        # Errors and rate limits are failures; skip decoding their bodies
+        if status != 200:
+            return [False] * len(items)
+        data = orjson.loads(body)
+
+        return self._accepted(data, len(items))
+
+    @staticmethod
+    def _accepted(data: dict, count: int) -> list[bool]:
+        """Per-item acceptance from a track.scrobble response."""
+        scrobbles = data.get("scrobbles")
+        if not scrobbles:
+            return [False] * count
+
+        # One entry per submitted scrobble (a bare object when there is one);
+        # ignoredMessage code "0" means it was accepted
+        entries = scrobbles.get("scrobble")
+        if isinstance(entries, dict):
+            entries = [entries]
+        if entries and len(entries) == count:
+            return [
+                str(entry.get("ignoredMessage", {}).get("code", "0")) == "0"
+                for entry in entries
+            ]
+
+        accepted = int(scrobbles.get("@attr", {}).get("accepted", 0))
+        return [accepted >= count] * count
 
     async def now_playing_lastfm(self, track: Track, config: ScrobbleConfig) -> bool:
         """Update now playing on Last.fm."""
+        return await self._now_playing(track, config, self.LASTFM_API_URL)
+
+    async def _now_playing(
+        self, track: Track, config: ScrobbleConfig, api_url: str
+    ) -> bool:
+        """Send one signed track.updateNowPlaying call."""
         if not config.session_key:
             return False
 
@@ -108,25 +191,13 @@ class LastfmScrobbler:
             "method": "track.updateNowPlaying",
             "api_key": config.api_key,
             "sk": config.session_key,
-            "artist": track.artist.name if track.artist else "Unknown",
-            "track": track.title,
+            **self._track_params(track),
         }
 
-        if track.album:
-            params["album"] = track.album.title
-
-        if track.duration:
-            params["duration"] = str(int(track.duration))
-
-        sig = self._generate_lastfm_signature(params, config.api_secret)
-        params["api_sig"] = sig
-        params["format"] = "json"
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.LASTFM_API_URL, data=params) as response:
-                data = await response.json()
-
-        return "nowplaying" in data
+        status, body = await self._signed_post(api_url, params, config.api_secret)
+        # Success is a top-level "nowplaying" object; a substring check
+        # answers that without decoding the body
+        return status == 200 and b'"nowplaying"' in body
 
     # =========================================================================
     # Libre.fm Scrobbling (uses same API as Last.fm)
@@ -136,32 +207,27 @@ class LastfmScrobbler:
         self, track: Track, config: ScrobbleConfig, timestamp: int
     ) -> bool:
         """Scrobble to Libre.fm (same API as Last.fm)."""
+        results = await self.scrobble_librefm_batch([(track, timestamp)], config)
+        return results[0]
+
+    async def scrobble_librefm_batch(
+        self, items: list[tuple[Track, int]], config: ScrobbleConfig
+    ) -> list[bool]:
+        """Scrobble up to MAX_BATCH (track, timestamp) pairs to Libre.fm in one call."""
         if not config.session_key:
             raise ValueError("Libre.fm not authenticated")
+        return await self._scrobble_batch(items, config, self.LIBREFM_API_URL)
 
-        params = {
-            "method": "track.scrobble",
-            "api_key": config.api_key,
-            "sk": config.session_key,
-            "artist": track.artist.name if track.artist else "Unknown",
-            "track": track.title,
-            "timestamp": str(timestamp),
-        }
-
-        if track.album:
-            params["album"] = track.album.title
+    async def now_playing_librefm(self, track: Track, config: ScrobbleConfig) -> bool:
+        """Update now playing on Libre.fm."""
+        return await self._now_playing(track, config, self.LIBREFM_API_URL)
 
-        sig = self._generate_lastfm_signature(params, config.api_secret)
-        params["api_sig"] = sig
+    async def _signed_post(
+        self, api_url: str, params: dict, secret: str
+    ) -> tuple[int, bytes]:
+        """Sign params, request a JSON response and POST them; returns (status, body)."""
+        params["api_sig"] = self._generate_lastfm_signature(params, secret)
         params["format"] = "json"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.LIBREFM_API_URL, data=params) as response:
-                data = await response.json()
-
-        return "scrobbles" in data
-
-    async def now_playing_librefm(self, track: Track, config: ScrobbleConfig) -> bool:
-        """Update now playing on Libre.fm."""
-        # Libre.fm uses same API as Last.fm
-        return await self.now_playing_lastfm(track, config)
+        session = await self._get_session()
+        return await post_with_retry(session, api_url, data=params)
@@ -1,8 +1,12 @@
 """ListenBrainz scrobbling implementation."""
 
+import gzip
 import aiohttp
+import orjson
+from typing import Awaitable, Callable
 
 from models import ScrobbleConfig, Track
+from .scrobble_http import post_with_retry
 
 
 class ListenBrainzScrobbler:
@@ -10,18 +14,27 @@ class ListenBrainzScrobbler:
 
     LISTENBRAINZ_API_URL = "https://api.listenbrainz.org/1/submit-listens"
 
-    def __init__(self):
-        pass
+    def __init__(self, get_session: Callable[[], Awaitable[aiohttp.ClientSession]]):
+        # Returns the process-wide HTTP session (see scrobble_http)
+        self._get_session = get_session
 
     async def scrobble_listenbrainz(
         self, track: Track, config: ScrobbleConfig, timestamp: int
     ) -> bool:
         """Scrobble to ListenBrainz."""
+        results = await self.scrobble_listenbrainz_batch([(track, timestamp)], config)
+        return results[0]
+
+    async def scrobble_listenbrainz_batch(
+        self, items: list[tuple[Track, int]], config: ScrobbleConfig
+    ) -> list[bool]:
+        """Submit several (track, timestamp) listens to ListenBrainz in one request."""
         if not config.session_key:  # Using session_key to store user token
             raise ValueError("ListenBrainz not authenticated")
 
         payload = {
-            "listen_type": "single",
+            # "single" takes exactly one listen; backfills go in as "import"
+            "listen_type": "single" if len(items) == 1 else "import",
             "payload": [
                 {
                     "listened_at": timestamp,
@@ -35,19 +48,25 @@ class ListenBrainzScrobbler:
                         },
                     },
                 }
+                for track, timestamp in items
             ],
         }
 
+        # Batched listens repeat the same keys, so the body compresses well
         headers = {
             "Authorization": f"Token {config.session_key}",
             "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.LISTENBRAINZ_API_URL, json=payload, headers=headers
-            ) as response:
-                return response.status == 200
+        session = await self._get_session()
+        status, _ = await post_with_retry(
+            session,
+            self.LISTENBRAINZ_API_URL,
+            data=gzip.compress(orjson.dumps(payload)),
+            headers=headers,
+        )
+        return [status == 200] * len(items)
 
     async def now_playing_listenbrainz(
         self, track: Track, config: ScrobbleConfig
@@ -74,8 +93,8 @@ class ListenBrainzScrobbler:
             "Content-Type": "application/json",
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.LISTENBRAINZ_API_URL, json=payload, headers=headers
-            ) as response:
-                return response.status == 200
+        session = await self._get_session()
+        status, _ = await post_with_retry(
+            session, self.LISTENBRAINZ_API_URL, data=orjson.dumps(payload), headers=headers
+        )
+        return status == 200
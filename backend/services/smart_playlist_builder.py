@@ -7,6 +7,10 @@ from sqlalchemy import and_, or_
 from models import Track, Artist, Album, TrackRating
 
 
+class InvalidRuleError(ValueError):
+    """A smart playlist rule or rule set that cannot be evaluated."""
+
+
 class SmartPlaylistRule:
     """Represents a single rule for smart playlist matching."""
 
@@ -25,17 +29,95 @@ class SmartPlaylistRule:
         "excluded": {"type": "boolean", "column": TrackRating.excluded},
     }
 
-    TEXT_OPERATORS = ["contains", "not_contains", "is", "is_not", "starts_with", "ends_with"]
-    NUMBER_OPERATORS = ["equals", "not_equals", "greater_than", "less_than", "between"]
-    DATE_OPERATORS = ["in_last", "not_in_last", "before", "after"]
-    BOOLEAN_OPERATORS = ["is_true", "is_false"]
+    # Filter clause builders per field type, keyed by operator; each takes
+    # (column, value, value2). Rules look up their builder with one dict access.
+    TEXT_CLAUSES = {
+        # Substring operators receive the LIKE pattern built from the value
+        "contains": lambda column, pattern, _: column.ilike(pattern),
+        "not_contains": lambda column, pattern, _: ~column.ilike(pattern),
+        "is": lambda column, value, _: column.ilike(value),
+        "is_not": lambda column, value, _: ~column.ilike(value),
+        "starts_with": lambda column, pattern, _: column.ilike(pattern),
+        "ends_with": lambda column, pattern, _: column.ilike(pattern),
+    }
+    LIKE_PATTERNS = {
+        "contains": "%{}%",
+        "not_contains": "%{}%",
+        "starts_with": "{}%",
+        "ends_with": "%{}",
+    }
+    NUMBER_CLAUSES = {
+        "equals": lambda column, value, _: column == value,
+        "not_equals": lambda column, value, _: column != value,
+        "greater_than": lambda column, value, _: column > value,
+        "less_than": lambda column, value, _: column < value,
+        "between": lambda column, value, value2: and_(column >= value, column <= value2),
+    }
+    DATE_CLAUSES = {
+        # Date operands arrive as datetimes: parsed ISO dates for before/after,
+        # and the cutoff resolved from a number of days for in_last/not_in_last
+        "in_last": lambda column, value, _: column >= value,
+        "not_in_last": lambda column, value, _: or_(column < value, column.is_(None)),
+        "before": lambda column, value, _: column < value,
+        "after": lambda column, value, _: column > value,
+    }
+    BOOLEAN_CLAUSES = {
+        "is_true": lambda column, value, _: column == True,
+        "is_false": lambda column, value, _: or_(column == False, column.is_(None)),
+    }
+    CLAUSES = {
+        "text": TEXT_CLAUSES,
+        "number": NUMBER_CLAUSES,
+        "date": DATE_CLAUSES,
+        "boolean": BOOLEAN_CLAUSES,
+    }
+
+    # Rough selectivity of each operator, narrowest first: equality and
+    # boolean tests, then ranges and index-friendly prefixes, then negations
+    # and substring scans. Rules are emitted in this order.
+    SELECTIVITY_RANKS = {
+        "is_true": 0, "is_false": 0,
+        "equals": 1, "is": 1,
+        "starts_with": 2, "greater_than": 2, "less_than": 2, "between": 2,
+        "before": 2, "after": 2, "in_last": 2,
+        "not_equals": 3, "is_not": 3, "not_in_last": 3,
+        "contains": 4, "ends_with": 4,
+        "not_contains": 5,
+    }
+
+    TEXT_OPERATORS = list(TEXT_CLAUSES)
+    NUMBER_OPERATORS = list(NUMBER_CLAUSES)
+    DATE_OPERATORS = list(DATE_CLAUSES)
+    BOOLEAN_OPERATORS = list(BOOLEAN_CLAUSES)
 
     def __init__(self, field: str, operator: str, value, value2=None):
+        # Reject bad rules up front: a rule that filtered nothing would
+        # copy the whole library into the playlist
+        field_info = self.FIELDS.get(field)
+        if not field_info:
+            raise InvalidRuleError(f"Unknown smart playlist field: {field}")
+        if operator not in self.CLAUSES[field_info["type"]]:
+            raise InvalidRuleError(f"Unknown operator for {field}: {operator}")
+
         self.field = field
         self.operator = operator
         self.value = value
         self.value2 = value2  # For 'between' operator
 
+        # Prepare operands once (LIKE patterns, parsed dates); parsed rules
+        # are cached and reapplied on every refresh
+        self._operand = value
+        if operator in self.LIKE_PATTERNS:
+            self._operand = self.LIKE_PATTERNS[operator].format(value)
+        elif field_info["type"] == "date":
+            try:
+                if operator in ("before", "after"):
+                    self._operand = datetime.fromisoformat(value)
+                elif operator in ("in_last", "not_in_last"):
+                    self._operand = timedelta(days=int(value))
+            except (TypeError, ValueError, OverflowError):
+                raise InvalidRuleError(f"Invalid value for {field} {operator}: {value!r}") from None
+
     def to_dict(self) -> dict:
         return {
             "field": self.field,
@@ -46,6 +128,8 @@ class SmartPlaylistRule:
 
     @classmethod
     def from_dict(cls, data: dict) -> "SmartPlaylistRule":
+        if "field" not in data or "operator" not in data or "value" not in data:
+            raise InvalidRuleError("Smart playlist rules need a field, operator and value")
         return cls(
             field=data["field"],
             operator=data["operator"],
@@ -53,74 +137,25 @@ class SmartPlaylistRule:
             value2=data.get("value2"),
         )
 
-    def apply(self, query):
+    def selectivity_rank(self) -> int:
+        """Estimated selectivity rank of this rule's operator (0 is narrowest)."""
+        return self.SELECTIVITY_RANKS[self.operator]
+
+    def predicate(self, now: Optional[datetime] = None):
+        """
+        Build this rule's filter clause.
+
+        Relative date rules count back from now; pass the same value to
+        every rule of a playlist so they agree on the cutoff.
+        """
+        field_info = self.FIELDS[self.field]
+        build = self.CLAUSES[field_info["type"]][self.operator]
+
+        operand = self._operand
+        if isinstance(operand, timedelta):
+            operand = (now or datetime.utcnow()) - operand
+        return build(field_info["column"], operand, self.value2)
+
+    def apply(self, query, now: Optional[datetime] = None):
         """Apply this rule to a SQLAlchemy query."""
-        field_info = self.FIELDS.get(self.field)
-        if not field_info:
-            return query
-
-        column = field_info["column"]
-        field_type = field_info["type"]
-
-        if field_type == "text":
-            return self._apply_text_rule(query, column)
-        elif field_type == "number":
-            return self._apply_number_rule(query, column)
-        elif field_type == "date":
-            return self._apply_date_rule(query, column)
-        elif field_type == "boolean":
-            return self._apply_boolean_rule(query, column)
-
-        return query
-
-    def _apply_text_rule(self, query, column):
-        if self.operator == "contains":
-            return query.filter(column.ilike(f"%{self.value}%"))
-        elif self.operator == "not_contains":
-            return query.filter(~column.ilike(f"%{self.value}%"))
-        elif self.operator == "is":
-            return query.filter(column.ilike(self.value))
-        elif self.operator == "is_not":
-            return query.filter(~column.ilike(self.value))
-        elif self.operator == "starts_with":
-            return query.filter(column.ilike(f"{self.value}%"))
-        elif self.operator == "ends_with":
-            return query.filter(column.ilike(f"%{self.value}"))
-        return query
-
-    def _apply_number_rule(self, query, column):
-        if self.operator == "equals":
-            return query.filter(column == self.value)
-        elif self.operator == "not_equals":
-            return query.filter(column != self.value)
-        elif self.operator == "greater_than":
-            return query.filter(column > self.value)
-        elif self.operator == "less_than":
-            return query.filter(column < self.value)
-        elif self.operator == "between":
-            return query.filter(and_(column >= self.value, column <= self.value2))
-        return query
-
-    def _apply_date_rule(self, query, column):
-        now = datetime.utcnow()
-        if self.operator == "in_last":
-            # value is number of days
-            cutoff = now - timedelta(days=int(self.value))
-            return query.filter(column >= cutoff)
-        elif self.operator == "not_in_last":
-            cutoff = now - timedelta(days=int(self.value))
-            return query.filter(or_(column < cutoff, column.is_(None)))
-        elif self.operator == "before":
-            date = datetime.fromisoformat(self.value)
-            return query.filter(column < date)
-        elif self.operator == "after":
-            date = datetime.fromisoformat(self.value)
-            return query.filter(column > date)
-        return query
-
-    def _apply_boolean_rule(self, query, column):
-        if self.operator == "is_true":
-            return query.filter(column == True)
-        elif self.operator == "is_false":
-            return query.filter(or_(column == False, column.is_(None)))
-        return query
+        return query.filter(self.predicate(now))
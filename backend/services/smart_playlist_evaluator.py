@@ -1,13 +1,54 @@
 """Smart playlist evaluation and track matching service."""
 
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
-from sqlalchemy import or_, desc, asc
+import orjson
+from sqlalchemy import or_, desc, asc, bindparam, select
 from sqlalchemy.orm import Session, joinedload
 
+from database import get_db_session
 from models import Playlist, Track, playlist_tracks
-from .smart_playlist_builder import SmartPlaylistRule
+from .smart_playlist_builder import InvalidRuleError, SmartPlaylistRule
+
+# Track ids per DELETE ... IN when patching playlist contents
+BATCH_SIZE = 500
+# Most tracks a rules preview returns; previews render every row
+PREVIEW_MAX_TRACKS = 500
+# Playlists refreshed concurrently by refresh_all_smart_playlists
+REFRESH_WORKERS = 4
+
+# SQLite takes one writer at a time, so refreshes take turns replacing
+# playlist contents instead of failing with "database is locked"
+_write_lock = threading.Lock()
+
+
+@lru_cache(maxsize=256)
+def _parse_rules(
+    raw: Optional[str],
+) -> tuple[tuple[SmartPlaylistRule, ...], bool, Optional[int], Optional[str], str]:
+    """
+    Parse a stored smart_rules string into (rules, match_all, limit, sort_by, sort_order).
+
+    Cached by the raw string: editing a playlist stores a new string, so
+    there is nothing to invalidate and stale entries just age out.
+    Raises InvalidRuleError for an invalid rule, or for rules that would copy
+    the whole library (no rules and no limit).
+    """
+    rules_data = orjson.loads(raw) if raw else {}
+    rules = tuple(SmartPlaylistRule.from_dict(r) for r in rules_data.get("rules", []))
+    limit = rules_data.get("limit")
+    if not rules and not limit:
+        raise InvalidRuleError("Smart playlist needs at least one rule or a limit")
+    return (
+        rules,
+        rules_data.get("match_all", True),
+        limit,
+        rules_data.get("sort_by"),
+        rules_data.get("sort_order", "asc"),
+    )
 
 
 class SmartPlaylistService:
@@ -15,6 +56,14 @@ class SmartPlaylistService:
 
     def __init__(self, db: Session):
         self.db = db
+        # Joined base query, built once per service; Query is generative, so
+        # every use derives a new query and leaves this one untouched
+        self._base_query = (
+            db.query(Track)
+            .outerjoin(Track.artist)
+            .outerjoin(Track.album)
+            .outerjoin(Track.rating)
+        )
 
     def create_smart_playlist(
         self,
@@ -46,11 +95,14 @@ class SmartPlaylistService:
             "sort_order": sort_order,
         }
 
+        raw_rules = orjson.dumps(smart_rules).decode()
+        _parse_rules(raw_rules)  # Validate before saving
+
         playlist = Playlist(
             name=name,
             description=description,
             is_smart=True,
-            smart_rules=json.dumps(smart_rules),
+            smart_rules=raw_rules,
         )
         self.db.add(playlist)
         self.db.commit()
@@ -77,12 +129,8 @@ class SmartPlaylistService:
         if not playlist or not playlist.is_smart:
             raise ValueError("Smart playlist not found")
 
-        current_rules = json.loads(playlist.smart_rules) if playlist.smart_rules else {}
+        current_rules = orjson.loads(playlist.smart_rules) if playlist.smart_rules else {}
 
-        if name is not None:
-            playlist.name = name
-        if description is not None:
-            playlist.description = description
         if rules is not None:
             current_rules["rules"] = rules
         if match_all is not None:
@@ -94,7 +142,14 @@ class SmartPlaylistService:
         if sort_order is not None:
             current_rules["sort_order"] = sort_order
 
-        playlist.smart_rules = json.dumps(current_rules)
+        raw_rules = orjson.dumps(current_rules).decode()
+        _parse_rules(raw_rules)  # Validate before changing anything
+
+        if name is not None:
+            playlist.name = name
+        if description is not None:
+            playlist.description = description
+        playlist.smart_rules = raw_rules
         playlist.updated_at = datetime.utcnow()
         self.db.commit()
 
@@ -114,61 +169,90 @@ class SmartPlaylistService:
         if not playlist or not playlist.is_smart:
             raise ValueError("Smart playlist not found")
 
-        rules_data = json.loads(playlist.smart_rules) if playlist.smart_rules else {}
-        rules = [SmartPlaylistRule.from_dict(r) for r in rules_data.get("rules", [])]
-        match_all = rules_data.get("match_all", True)
-        limit = rules_data.get("limit")
-        sort_by = rules_data.get("sort_by")
-        sort_order = rules_data.get("sort_order", "asc")
-
-        query = self._build_base_query()
-        query = self._apply_rules(query, rules, match_all)
+        rules, match_all, limit, sort_by, sort_order = _parse_rules(playlist.smart_rules)
 
-        # Apply sorting
-        if sort_by:
-            sort_column = SmartPlaylistRule.FIELDS.get(sort_by, {}).get("column", Track.title)
-            if sort_order == "desc":
-                query = query.order_by(desc(sort_column))
-            else:
-                query = query.order_by(asc(sort_column))
+        # Only the ids are needed; a track's position is its index
+        now = datetime.utcnow()
+        query = self._build_base_query(Track.id)
+        query = self._apply_rules(query, rules, match_all, now)
+        order_by = self._order_by(sort_by, sort_order)
+        if order_by:
+            query = query.order_by(*order_by)
 
         # Apply limit
         if limit:
             query = query.limit(limit)
 
-        matching_tracks = query.all()
-
-        # Clear existing tracks
-        self.db.execute(
-            playlist_tracks.delete().where(playlist_tracks.c.playlist_id == playlist_id)
-        )
-
-        # Add matching tracks
-        for i, track in enumerate(matching_tracks):
-            self.db.execute(
-                playlist_tracks.insert().values(
-                    playlist_id=playlist_id,
-                    track_id=track.id,
-                    position=i,
-                )
+        new_positions = {track_id: i for i, (track_id,) in enumerate(query)}
+
+        with _write_lock:
+            # Patch the stored rows towards the new result instead of
+            # rewriting them all; an unchanged playlist costs no writes
+            columns = playlist_tracks.c
+            current = dict(
+                self.db.execute(
+                    select(columns.track_id, columns.position)
+                    .where(columns.playlist_id == playlist_id)
+                ).all()
             )
+            removed = [track_id for track_id in current if track_id not in new_positions]
+            added = [
+                {"playlist_id": playlist_id, "track_id": track_id, "position": position}
+                for track_id, position in new_positions.items()
+                if track_id not in current
+            ]
+            moved = [
+                {"moved_track_id": track_id, "new_position": position}
+                for track_id, position in new_positions.items()
+                if track_id in current and current[track_id] != position
+            ]
+
+            for i in range(0, len(removed), BATCH_SIZE):
+                self.db.execute(
+                    playlist_tracks.delete().where(
+                        columns.playlist_id == playlist_id,
+                        columns.track_id.in_(removed[i:i + BATCH_SIZE]),
+                    )
+                )
+            if added:
+                self.db.execute(playlist_tracks.insert(), added)
+            if moved:
+                self.db.execute(
+                    playlist_tracks.update()
+                    .where(
+                        columns.playlist_id == playlist_id,
+                        columns.track_id == bindparam("moved_track_id"),
+                    )
+                    .values(position=bindparam("new_position")),
+                    moved,
+                )
 
-        playlist.updated_at = datetime.utcnow()
-        self.db.commit()
+            # The patch and updated_at change share the single commit below
+            if removed or added or moved:
+                playlist.updated_at = now
+                self.db.commit()
 
-        return len(matching_tracks)
+        return len(new_positions)
 
     def refresh_all_smart_playlists(self) -> dict:
-        """Refresh all smart playlists."""
-        playlists = self.db.query(Playlist).filter(Playlist.is_smart == True).all()
+        """Refresh all smart playlists concurrently, one session per worker."""
+        playlist_ids = [
+            playlist_id
+            for (playlist_id,) in self.db.query(Playlist.id).filter(Playlist.is_smart == True)
+        ]
 
         results = {"refreshed": 0, "errors": []}
-        for playlist in playlists:
-            try:
-                self.refresh_smart_playlist(playlist.id)
-                results["refreshed"] += 1
-            except Exception as e:
-                results["errors"].append({"playlist_id": playlist.id, "error": str(e)})
+        with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+            futures = [
+                (playlist_id, pool.submit(_refresh_in_own_session, playlist_id))
+                for playlist_id in playlist_ids
+            ]
+            for playlist_id, future in futures:
+                try:
+                    future.result()
+                    results["refreshed"] += 1
+                except Exception as e:
+                    results["errors"].append({"playlist_id": playlist_id, "error": str(e)})
 
         return results
 
@@ -178,7 +262,7 @@ class SmartPlaylistService:
         if not playlist or not playlist.is_smart:
             raise ValueError("Smart playlist not found")
 
-        return json.loads(playlist.smart_rules) if playlist.smart_rules else {}
+        return orjson.loads(playlist.smart_rules) if playlist.smart_rules else {}
 
     def preview_smart_playlist(
         self,
@@ -200,39 +284,51 @@ class SmartPlaylistService:
         )
         query = self._apply_rules(query, parsed_rules, match_all)
 
-        if sort_by:
-            sort_column = SmartPlaylistRule.FIELDS.get(sort_by, {}).get("column", Track.title)
-            if sort_order == "desc":
-                query = query.order_by(desc(sort_column))
-            else:
-                query = query.order_by(asc(sort_column))
+        order_by = self._order_by(sort_by, sort_order)
+        if order_by:
+            query = query.order_by(*order_by)
 
-        if limit:
-            query = query.limit(limit)
+        query = query.limit(min(limit, PREVIEW_MAX_TRACKS) if limit else PREVIEW_MAX_TRACKS)
 
         return query.all()
-    def _build_base_query(self):
-        """Build base query with necessary joins."""
-        return (
-            self.db.query(Track)
-            .outerjoin(Track.artist)
-            .outerjoin(Track.album)
-            .outerjoin(Track.rating)
-        )
-    def _apply_rules(self, query, rules, match_all):
+
+    @staticmethod
+    def _order_by(sort_by: Optional[str], sort_order: str) -> list:
+        """
+        ORDER BY clauses for a playlist's sort field.
+
+        Ties are broken on Track.id so a limited playlist keeps the same
+        tracks from one refresh to the next.
+        """
+        if not sort_by:
+            return []
+        sort_column = SmartPlaylistRule.FIELDS.get(sort_by, {}).get("column", Track.title)
+        if sort_order == "desc":
+            return [desc(sort_column), asc(Track.id)]
+        return [asc(sort_column), asc(Track.id)]
+
+    def _build_base_query(self, *entities):
+        """Build base query (of full tracks unless entities are given) with necessary joins."""
+        if entities:
+            return self._base_query.with_entities(*entities)
+        return self._base_query
+
+    def _apply_rules(self, query, rules, match_all, now=None):
         """Apply smart rules to query with AND or OR logic."""
         if not rules:
             return query
+        # One reference time for every relative date rule
+        now = now or datetime.utcnow()
+        # Most selective predicates first; AND/OR are commutative, so this
+        # only changes the order the database sees them in
+        rules = sorted(rules, key=SmartPlaylistRule.selectivity_rank)
         if match_all:
             for rule in rules:
-                query = rule.apply(query)
+                query = rule.apply(query, now)
         else:
-            conditions = []
-            for rule in rules:
-                sub = self._build_base_query()
-                sub = rule.apply(sub)
-                conditions.append(Track.id.in_(sub))
-            query = query.filter(or_(*conditions))
+            # One OR over the already-joined query rather than an IN
+            # subquery per rule
+            query = query.filter(or_(*(rule.predicate(now) for rule in rules)))
         return query
 
     @staticmethod
@@ -248,3 +344,9 @@ class SmartPlaylistService:
             "date_operators": SmartPlaylistRule.DATE_OPERATORS,
             "boolean_operators": SmartPlaylistRule.BOOLEAN_OPERATORS,
         }
+
+
+def _refresh_in_own_session(playlist_id: str) -> int:
+    """Refresh one smart playlist from a worker thread with its own session."""
+    with get_db_session() as db:
+        return SmartPlaylistService(db).refresh_smart_playlist(playlist_id)
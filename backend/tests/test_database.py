@@ -0,0 +1,50 @@
+"""Tests for the startup schema migration in database.init_db."""
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+import database
+
+
+@pytest.fixture
+def legacy_engine(tmp_path, monkeypatch):
+    """An engine on a database whose scrobble_config predates the unique index."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE scrobble_config ("
+            "id VARCHAR PRIMARY KEY, service VARCHAR NOT NULL, enabled BOOLEAN, "
+            "username VARCHAR, session_key VARCHAR, api_key VARCHAR, api_secret VARCHAR)"
+        ))
+        conn.execute(text(
+            "INSERT INTO scrobble_config (id, service, username) VALUES "
+            "('a', 'lastfm', 'first'), ('b', 'lastfm', 'second'), ('c', 'listenbrainz', 'lb')"
+        ))
+    monkeypatch.setattr(database, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def test_migration_adds_columns_and_unique_service_index(legacy_engine):
+    database.init_db()
+    database.init_db()  # A second startup finds nothing left to do
+
+    inspector = inspect(legacy_engine)
+    columns = {column["name"] for column in inspector.get_columns("scrobble_config")}
+    assert {"created_at", "updated_at"} <= columns
+    indexes = {index["name"]: index for index in inspector.get_indexes("scrobble_config")}
+    assert indexes["ix_scrobble_configs_service"]["unique"]
+
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT service, username FROM scrobble_config ORDER BY service")
+        ).all()
+    # The duplicate lastfm row is dropped; the one lookups returned is kept
+    assert rows == [("lastfm", "first"), ("listenbrainz", "lb")]
+
+    with pytest.raises(IntegrityError):
+        with legacy_engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO scrobble_config (id, service) VALUES ('d', 'lastfm')"
+            ))
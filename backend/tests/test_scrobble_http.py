@@ -0,0 +1,48 @@
+"""Tests for the scrobble HTTP retry helper."""
+
+import asyncio
+
+from services import scrobble_http
+
+
+class FakeResponse:
+    def __init__(self, status, body=b"ok"):
+        self.status = status
+        self.headers = {}
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    """Replays one outcome per post(): an exception to raise or a response."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_post_with_retry_retries_after_timeout(monkeypatch):
+    monkeypatch.setattr(scrobble_http, "BACKOFF_BASE", 0.0)
+    session = FakeSession(asyncio.TimeoutError(), FakeResponse(200))
+
+    status, body = asyncio.run(
+        scrobble_http.post_with_retry(session, "https://example.test/scrobble")
+    )
+
+    assert (status, body) == (200, b"ok")
+    assert session.calls == 2